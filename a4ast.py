@@ -0,0 +1,214 @@
+"""Binary format of MustScript ASTs.
+
+A tree is written as a header, a table of the strings it holds (variable,
+procedure and parameter names, operators and string literals), then its
+values in postorder, so the loader builds every node from the values on top
+of a stack without recursing:
+
+    header   b"MSAST" VERSION
+    strings  count, then the length and UTF-8 bytes of each string
+    values   NONE | INT zigzag | STR index | LIST count | REF index
+             | tag line+1 column+1 cost, after the fields of the node
+
+Counts, indices and positions are varints: 7 bits per byte, least
+significant first, the high bit set on every byte but the last.  A node
+seen again, such as a Hoisted expression used at several places of a loop,
+is written as a REF to the index of its first occurrence, so the loaded tree
+shares it too.  Node tags are the positions of the classes in NODES: new
+classes are only appended, and VERSION changes if the fields of a class do.
+"""
+
+import gc
+import operator
+
+from a4main import (Var, Int, String, Array, Index, Slice, BinOpExp, IntAdd, IntSub, IntMul,
+                    IntDiv, IntEq, IntLt, IntGt, IntAnd, IntOr, StrAdd, And, Or, IntAndThen,
+                    IntOrElse, UniOpExp, IntNot, Hoisted, Print, Assign, Block, If, While,
+                    HoistingWhile, Def, Call, LocalAssign, GlobalAssign, IndexAssign, Node)
+
+MAGIC = b"MSAST"
+VERSION = 1
+
+NODES = (Var, Int, String, Array, Index, Slice, BinOpExp, IntAdd, IntSub, IntMul, IntDiv,
+         IntEq, IntLt, IntGt, IntAnd, IntOr, StrAdd, And, Or, IntAndThen, IntOrElse,
+         UniOpExp, IntNot, Hoisted, Print, Assign, Block, If, While, HoistingWhile, Def, Call,
+         LocalAssign, GlobalAssign, IndexAssign)
+
+# Opcodes of values that are not nodes; node tags follow them.
+NONE, INT, STR, LIST, REF = range(5)
+TAG = 5
+
+TAGS = dict((cls, TAG + i) for i, cls in enumerate(NODES))
+
+def _varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _fields(cls):
+    """Return a function returning the fields of a cls node, last first."""
+    names = cls.fields[::-1]
+    if len(names) > 1: return operator.attrgetter(*names)
+    if names: return lambda v, get=operator.attrgetter(names[0]): (get(v),)
+    return lambda v: ()
+
+# (tag, function returning the fields last first) of each node class
+LAYOUTS = dict((cls, (TAGS[cls], _fields(cls))) for cls in NODES)
+
+def dumps(tree):
+    """Return the bytes of the binary format of tree."""
+    strings, nodes = {}, {}
+    out = bytearray()
+    layouts = LAYOUTS
+    # Values still to write, the next one last.  A node or list is pushed
+    # again in a 1-tuple, below its values, to be closed once they are
+    # written, so nested code of any depth is written without recursing.
+    stack = [tree]
+    push, extend, pop = stack.append, stack.extend, stack.pop
+    while stack:
+        v = pop()
+        t = type(v)
+        layout = layouts.get(t)
+        if layout is not None:
+            ref = nodes.get(id(v))
+            if ref is not None:
+                out.append(REF)
+                _varint(out, ref)
+            else:
+                push((v,))
+                extend(layout[1](v))
+        elif t is str:
+            out.append(STR)
+            _varint(out, strings.setdefault(v, len(strings)))
+        elif t is tuple:
+            v = v[0]
+            if type(v) is list:
+                out.append(LIST)
+                _varint(out, len(v))
+            else:
+                nodes[id(v)] = len(nodes)
+                out.append(layouts[type(v)][0])
+                _varint(out, 0 if v.line is None else v.line + 1)
+                _varint(out, 0 if v.column is None else v.column + 1)
+                _varint(out, v.cost)
+        elif v is None:
+            out.append(NONE)
+        elif t is int:
+            out.append(INT)
+            _varint(out, v << 1 if v >= 0 else (-v << 1) - 1)
+        elif t is list:
+            push((v,))
+            extend(v[::-1])
+        elif isinstance(v, Node):
+            raise ValueError('cannot serialize %s nodes' % t.__name__)
+        else:
+            raise ValueError('cannot serialize %r' % (v,))
+    head = bytearray(MAGIC)
+    _varint(head, VERSION)
+    _varint(head, len(strings))
+    for s in strings:
+        b = s.encode('utf-8')
+        _varint(head, len(b))
+        head += b
+    return bytes(head + out)
+
+def loads(data):
+    """Return the tree written by dumps in data, raising ValueError if data
+    is not in this version of the format.
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError('not a MustScript AST')
+    # The nodes hold no cycles: collecting while they are made only costs time.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load(data)
+    finally:
+        if enabled: gc.enable()
+
+def _load(data):
+    pos = len(MAGIC)
+
+    def varint():
+        nonlocal pos
+        n = shift = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80: return n
+            shift += 7
+
+    try:
+        if varint() != VERSION:
+            raise ValueError('unsupported MustScript AST version')
+        strings = []
+        for _ in range(varint()):
+            n = varint()
+            strings.append(data[pos:pos + n].decode('utf-8'))
+            pos += n
+        # (class, number of fields) of each tag
+        classes = [None] * TAG + [(cls, len(cls.fields)) for cls in NODES]
+        stack, nodes = [], []
+        push, end = stack.append, len(data)
+        while pos < end:
+            op = data[pos]
+            pos += 1
+            # The operands of most opcodes are below 128: read them inline.
+            if op >= TAG:
+                cls, n = classes[op]
+                if n:
+                    node = cls(*stack[-n:])
+                    del stack[-n:]
+                else:
+                    node = cls()
+                line = data[pos]
+                if line < 0x80: pos += 1
+                else: line = varint()
+                column = data[pos]
+                if column < 0x80: pos += 1
+                else: column = varint()
+                cost = data[pos]
+                if cost < 0x80: pos += 1
+                else: cost = varint()
+                if line: node.line = line - 1
+                if column: node.column = column - 1
+                if cost != 1: node.cost = cost
+                nodes.append(node)
+                push(node)
+                continue
+            if op == NONE:
+                push(None)
+                continue
+            n = data[pos]
+            if n < 0x80: pos += 1
+            else: n = varint()
+            if op == STR:
+                push(strings[n])
+            elif op == REF:
+                push(nodes[n])
+            elif op == LIST:
+                if n:
+                    values = stack[-n:]
+                    del stack[-n:]
+                    push(values)
+                else:
+                    push([])
+            elif op == INT:
+                push(n >> 1 if not n & 1 else -((n + 1) >> 1))
+            else:
+                raise ValueError('corrupt MustScript AST')
+    except (IndexError, TypeError, UnicodeDecodeError):
+        raise ValueError('corrupt MustScript AST')
+    if len(stack) != 1:
+        raise ValueError('corrupt MustScript AST')
+    return stack[0]
+
+def dump(tree, f):
+    """Write the binary format of tree to the binary file f."""
+    f.write(dumps(tree))
+
+def load(f):
+    """Return the tree read from the binary file f, see loads."""
+    return loads(f.read())
@@ -0,0 +1,86 @@
+"""Parse the files of a MustScript project in parallel.
+
+    python a4build.py [--workers N] [--eager-logic] FILE...
+
+Files are parsed by a pool of worker processes, each of which keeps one
+warm Parser for its whole life and reads the files itself, so only paths
+go to the workers.  Trees come back pickled, as the class and fields of
+each node (see Node.__reduce__).  Prints each file with "ok" or its error,
+and exits with status 1 if any file failed to parse.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import tpg
+import a4main
+
+# Parser of a worker process, made by start_worker
+_parser = None
+
+# Python recursion limit while parsing: deeply nested code recurses deeply
+DEPTH = 100000
+
+def start_worker(short_circuit=True):
+    """Make the parser of a worker process."""
+    global _parser
+    _parser = a4main.Parser()
+    _parser.short_circuit = short_circuit
+    sys.setrecursionlimit(max(DEPTH, sys.getrecursionlimit()))
+
+def parse_file(path):
+    """Return (path, tree or error message) for the file at path."""
+    with open(path) as f:
+        source = f.read()
+    try:
+        return path, _parser(source)
+    except tpg.Error:
+        return path, 'Parsing Error'
+    except RecursionError:
+        return path, 'Recursion Limit Exceeded'
+
+def parse_files(paths, workers=None, short_circuit=True):
+    """Return a dict mapping each path to its tree, or to its error message.
+
+    workers: number of worker processes, os.cpu_count() by default; with 1,
+             the files are parsed in this process.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) < 2:
+        # This process is not a worker: give its recursion limit back.
+        depth = sys.getrecursionlimit()
+        try:
+            start_worker(short_circuit)
+            return dict(parse_file(path) for path in paths)
+        finally:
+            sys.setrecursionlimit(depth)
+    # A few chunks per worker: large enough to amortize the round trips,
+    # small enough to balance files of different sizes.
+    chunksize = max(1, len(paths) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=start_worker,
+                                                initargs=(short_circuit,)) as pool:
+        return dict(pool.map(parse_file, paths, chunksize=chunksize))
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument('files', nargs='+')
+    args.add_argument('--workers', type=int, help='worker processes, one per core by default')
+    args.add_argument('--eager-logic', action='store_true',
+                      help='evaluate both operands of "and" and "or"')
+    args = args.parse_args()
+    start = time.perf_counter()
+    trees = parse_files(args.files, args.workers, not args.eager_logic)
+    failed = 0
+    for path in args.files:
+        tree = trees[path]
+        if isinstance(tree, str):
+            failed += 1
+            print('%s: %s' % (path, tree))
+        else:
+            print('%s: ok' % path)
+    print('%d files parsed in %.3f s, %d failed' % (len(args.files), time.perf_counter() - start, failed))
+    sys.exit(1 if failed else 0)
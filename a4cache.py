@@ -0,0 +1,143 @@
+"""Cache of loaded MustScript programs.
+
+Loaded programs are kept in an in-memory LRU and, optionally, pickled on
+disk, so a program submitted again skips lexing, parsing and procedure
+collection.  Programs that fail to load are cached as their error message.
+
+Entries are keyed by the SHA-256 of the source together with VERSION, a
+digest of the interpreter and parser generator sources: any change to
+a4main.py (its grammar or its node classes) or to tpg.py gives new keys, so
+stale entries are never loaded.  Disk entries are written atomically, and
+an entry that cannot be read back is deleted and treated as missing.
+"""
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+
+import tpg
+import a4main
+
+def _digest(*paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+VERSION = _digest(a4main.__file__, tpg.__file__)
+
+def default_directory():
+    """Return $MUSTSCRIPT_CACHE, or ~/.cache/mustscript."""
+    return os.environ.get('MUSTSCRIPT_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'mustscript')
+
+class ProgramCache(object):
+    """Two-tier cache of loaded programs.
+
+    maxsize: number of entries kept in memory, least recently used first out.
+    directory: where entries are pickled, None to keep them in memory only.
+    """
+
+    def __init__(self, maxsize=256, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(source, short_circuit=True):
+        # Programs parsed with eager "and" and "or" have other trees.
+        version = VERSION if short_circuit else VERSION + '-eager'
+        return hashlib.sha256((version + '\0' + source).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached entry for key, or None."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        entry = self.read(key)
+        if entry is not None:
+            self.disk_hits += 1
+            self.remember(key, entry)
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        self.remember(key, entry)
+        self.write(key, entry)
+
+    def remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def load(self, interp, source):
+        """Return (program or error message, whether it came from the cache),
+        loading the program with interp on a miss.
+        """
+        key = self.key(source, interp.short_circuit)
+        entry = self.get(key)
+        if entry is not None:
+            return entry, True
+        try:
+            entry = interp.load(source)
+        except tpg.Error:
+            entry = 'Parsing Error'
+        except a4main.EvalError:
+            entry = 'Evaluation Error'
+        self.put(key, entry)
+        return entry, False
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def read(self, key):
+        if self.directory is None:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                version, entry = pickle.load(f)
+            if version == VERSION:
+                return entry
+        except FileNotFoundError:
+            return None
+        except Exception:
+            pass
+        # Unreadable or stale entry
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    def write(self, key, entry):
+        if self.directory is None:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((VERSION, entry), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path(key))
+        except (OSError, pickle.PicklingError, RecursionError):
+            # Too deep to pickle, or no room on disk: keep it in memory only.
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drop every entry, in memory and on disk."""
+        self.entries.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pickle'):
+                    os.remove(os.path.join(self.directory, name))
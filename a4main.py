@@ -1,96 +1,577 @@
+import collections
+import reprlib
 import sys
+import time
+import weakref
 import tpg
-import pdb
 
 class EvalError(Exception):
     """Class of exceptions raised when an error occurs during evaluation."""
 
+class LimitError(Exception):
+    """Class of exceptions raised when a program exceeds a resource limit.
+    kind: name of the exceeded limit, such as 'Time'.
+    """
+
+    def __init__(self, kind):
+        Exception.__init__(self, kind)
+        self.kind = kind
+
+# Static types of values, from the least to the most general: BOTTOM for
+# no value at all (a variable never assigned), int, str, and ANY for any
+# value, including arrays.
+
+BOTTOM = None
+ANY = object
+
+def join_types(t1, t2):
+    """Return the least static type more general than both t1 and t2."""
+    if t1 is BOTTOM or t1 is t2: return t2
+    if t2 is BOTTOM: return t1
+    return ANY
+
+def proven(t, cls):
+    """Return whether every value of static type t is an instance of cls."""
+    return t is BOTTOM or t is cls
+
+# String values built by concatenation are Ropes once they are long enough,
+# so a loop appending to a string takes linear, not quadratic, time.
+
+class Rope(object):
+    """Class of strings built by appending parts, joined when first needed.
+
+    Ropes appended to share one list of parts: a rope is its first count
+    parts, and appending to the rope holding all of them just adds a part.
+    Appending to an older rope copies it first, so ropes are never modified.
+    """
+
+    __slots__ = ('parts', 'count', 'length', 'flat')
+
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.count = len(parts)
+        self.length = length
+        self.flat = None
+
+    def append(self, s):
+        """Return the rope of this string followed by s."""
+        if not isinstance(s, str): s = str(s)
+        parts = self.parts
+        if self.count != len(parts):
+            parts = [str(self)]
+        parts.append(s)
+        return Rope(parts, self.length + len(s))
+
+    def __str__(self):
+        if self.flat is None:
+            parts = self.parts
+            self.flat = ''.join(parts if self.count == len(parts) else parts[:self.count])
+        return self.flat
+
+    def __len__(self): return self.length
+
+    def __repr__(self): return repr(str(self))
+
+    def __eq__(self, other):
+        if not isinstance(other, str):
+            if not isinstance(other, STRINGS): return False
+            other = str(other)
+        return self.length == len(other) and str(self) == other
+
+    def __hash__(self): return hash(str(self))
+
+# Shorter strings are built directly.
+ROPE_MIN = 256
+
+# Slices of arrays and strings, a[i:j], are views sharing the storage of
+# the sliced value, so slicing takes constant time and memory.
+
+class StrView(object):
+    """Class of strings that are the characters start to stop of a str."""
+
+    __slots__ = ('source', 'start', 'stop', 'flat')
+
+    def __init__(self, source, start, stop):
+        self.source = source
+        self.start = start
+        self.stop = stop
+        self.flat = None
+
+    def __str__(self):
+        if self.flat is None: self.flat = self.source[self.start:self.stop]
+        return self.flat
+
+    def __len__(self): return self.stop - self.start
+
+    def __getitem__(self, i):
+        return self.source[self.start + offset(i, self.stop - self.start)]
+
+    def __repr__(self): return repr(str(self))
+
+    def __eq__(self, other):
+        if not isinstance(other, STRINGS): return False
+        return len(self) == len(other) and str(self) == str(other)
+
+    def __hash__(self): return hash(str(self))
+
+class ArrayView(object):
+    """Class of arrays that are the elements start to stop of a list.
+
+    A view shares the list with the array it was sliced from until either
+    is stored into: a view copies its elements before its first store, and
+    Interpreter.store makes the views of a list copy theirs before a store
+    into the list.  owner is True once the view has its own list.
+    """
+
+    __slots__ = ('items', 'start', 'stop', 'owner', '__weakref__')
+
+    def __init__(self, items, start, stop):
+        self.items = items
+        self.start = start
+        self.stop = stop
+        self.owner = False
+
+    def own(self, interp):
+        """Copy the elements into a list of the view's own."""
+        if not self.owner:
+            interp.alloc(56 + 8 * (self.stop - self.start))
+            self.items = self.items[self.start:self.stop]
+            self.start, self.stop = 0, len(self.items)
+            self.owner = True
+
+    def __len__(self): return self.stop - self.start
+
+    def __getitem__(self, i):
+        return self.items[self.start + offset(i, self.stop - self.start)]
+
+    # Arrays may contain themselves, printed [...] as lists are.
+    @reprlib.recursive_repr('[...]')
+    def __repr__(self): return repr(self.items[self.start:self.stop])
+
+    # Arrays may change, they are not hashable.
+    __hash__ = None
+
+STRINGS = (str, Rope, StrView)
+SEQUENCES = (list, str, ArrayView, StrView)
+
+# Shorter slices are copied.
+VIEW_MIN = 64
+
+def offset(i, length):
+    """Return the offset of the element i of a sequence, raising IndexError
+    out of range; negative indexes count from the end, as for lists.
+    """
+    if i < 0: i += length
+    if i < 0 or i >= length: raise IndexError(i)
+    return i
+
+def slice_value(interp, v, start, stop):
+    """Return the slice of the array or string v from start to stop, either
+    may be None for the ends.  As in Python, negative bounds count from the
+    end and bounds out of range are clamped.
+    """
+    if isinstance(v, Rope): v = str(v)
+    if not isinstance(v, SEQUENCES): raise EvalError()
+    if start is not None and not isinstance(start, int): raise EvalError()
+    if stop is not None and not isinstance(stop, int): raise EvalError()
+    start, stop, _ = slice(start, stop).indices(len(v))
+    stop = max(start, stop)
+    if isinstance(v, (ArrayView, StrView)):
+        # Views of views share the same storage.
+        base = v.start
+        v = v.items if isinstance(v, ArrayView) else v.source
+        start, stop = base + start, base + stop
+    if stop - start < VIEW_MIN:
+        interp.alloc(56 + 8 * (stop - start) if isinstance(v, list) else stop - start)
+        return v[start:stop]
+    if isinstance(v, str): return StrView(v, start, stop)
+    view = ArrayView(v, start, stop)
+    interp.share(v, view)
+    return view
+
+def concat(s1, s2):
+    """Return the string s1 followed by s2, either may be a Rope or StrView."""
+    if isinstance(s1, Rope): return s1.append(s2)
+    if not isinstance(s1, str): s1 = str(s1)
+    if not isinstance(s2, str): s2 = str(s2)
+    if len(s1) + len(s2) < ROPE_MIN: return s1 + s2
+    return Rope([s1, s2], len(s1) + len(s2))
+
 # These are the classes of nodes of our abstract syntax trees (ASTs).
 
-class Node(object):
+class NodeMeta(type):
+    """Metaclass of AST nodes.
+
+    A class defining "fields" gets __slots__ for the fields it adds to its
+    base classes, so nodes carry no __dict__, and an __init__ generated for
+    its fields, which assigns them directly instead of looping over setattr.
+    Such a class is also a kind of node of its own, labelled by its name;
+    subclasses that only specialize its methods keep its label.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        fields = namespace.get('fields')
+        if fields is not None: namespace.setdefault('label', name)
+        if '__slots__' not in namespace:
+            inherited = set(f for b in bases for f in getattr(b, 'fields', ()))
+            namespace['__slots__'] = tuple(f for f in fields or () if f not in inherited)
+        cls = type.__new__(mcs, name, bases, namespace)
+        if fields is not None and '__init__' not in namespace:
+            cls.__init__ = mcs.make_init(name, fields)
+        return cls
+
+    @staticmethod
+    def make_init(name, fields):
+        source = "def __init__(self%s):\n" % "".join(", " + f for f in fields)
+        source += "    self.line = self.column = None\n"
+        source += "    self.cost = 1\n"
+        source += "".join("    self.%s = %s\n" % (f, f) for f in fields)
+        namespace = {}
+        exec(compile(source, "<%s.__init__>" % name, "exec"), namespace)
+        return namespace['__init__']
+
+class Node(object, metaclass=NodeMeta):
     """Base class of AST nodes."""
 
     # For each class of nodes, store names of the fields for children nodes.
     fields = []
 
+    # label: name of the construct of the source the node stands for, the
+    #        same for the classes the analysis specializes it into, shown by
+    #        tools such as the profiler.
+
+    # line, column: position of the first token of statements in the source,
+    #               set by the parser.
+    # cost: number of steps charged each time a statement runs (or, for
+    #       loops, each iteration), set by anlz_costs.
+    __slots__ = ('line', 'column', 'cost')
+
     def __init__(self, *args):
         """Populate fields named in "fields" with values in *args."""
         assert(len(self.fields) == len(args))
+        self.line = self.column = None
+        self.cost = 1
         for f, a in zip(self.fields, args): setattr(self, f, a)
 
-    def anlz_procs(self):
-        """Collect procedure definitions, called on statements."""
+    def __reduce__(self):
+        """Pickle the node as its class and fields, plus its position and
+        cost when set, rather than as a dictionary of all its slots.
+        """
+        state = (self.line, self.column, self.cost)
+        if state == (None, None, 1): state = None
+        return self.__class__, tuple(getattr(self, f) for f in self.fields), state
+
+    def __setstate__(self, state):
+        self.line, self.column, self.cost = state
+
+    def children(self):
+        """Return the AST nodes found in the fields of this node."""
+        nodes = []
+        for f in self.fields:
+            v = getattr(self, f)
+            if isinstance(v, Node): nodes.append(v)
+            elif isinstance(v, list): nodes.extend(c for c in v if isinstance(c, Node))
+        return nodes
+
+    def size(self):
+        """Return the number of expression nodes evaluated by an expression."""
+        return 1 + sum(c.size() for c in self.children())
+
+    def anlz_procs(self, proc_env):
+        """Collect procedure definitions, called on statements.
+        proc_env: mapping of procedure names to their parameters and body.
+        """
         raise Exception("Not implemented.")
 
-    def eval(self):
-        """Evaluate the AST node, called on nodes of expression subclasses."""
+    def anlz_costs(self):
+        """Set the step cost of statements: one step for the statement itself
+        (or loop iteration, or call) plus one per expression node it evaluates.
+        """
+        self.cost = 1 + sum(c.size() for c in self.children())
+
+    def anlz_types(self, types, proc_env):
+        """Join the static types of the values a statement may store into
+        the variables it assigns, or into the parameters of procedures it
+        calls.
+        types: mapping of variable names to static types, see join_types.
+        """
+        pass
+
+    def static_type(self, types):
+        """Return the static type of the values of an expression."""
+        return ANY
+
+    def truth(self, interp, local_var_env):
+        """Evaluate an expression used as a condition, returning whether its
+        value is not 0.  Conditions and logical operations override it to
+        skip building the 1 or 0 they would return.
+        """
+        return self.eval(interp, local_var_env) != 0
+
+    def specialize(self, types):
+        """Return the node with its children, and itself if its operand types
+        are proven by types, replaced with unchecked specialized nodes.
+        """
+        for f in self.fields:
+            v = getattr(self, f)
+            if isinstance(v, Node):
+                setattr(self, f, v.specialize(types))
+            elif isinstance(v, list):
+                setattr(self, f, [c.specialize(types) if isinstance(c, Node) else c for c in v])
+        return self
+
+    def specialize_stores(self, is_global):
+        """Return the statement with the assignments it contains replaced
+        with stores specialized on their target and on their scope.
+        is_global: whether the statement runs in the global scope, that is,
+                   outside of any procedure.
+        """
+        return self
+
+    # Compilation of hot loops to Python, see LoopCompiler.
+
+    def jit_eval(self, c):
+        """Emit with c the Python statements evaluating an expression, and
+        return the name or literal holding its value.
+        """
+        raise CannotCompile()
+
+    def jit_truth(self, c):
+        """Emit the statements of an expression used as a condition, and
+        return a Python expression true when its value is not 0.
+        """
+        v = self.jit_eval(c)
+        return v if self.jit_int(c) else '%s != 0' % v
+
+    def jit_int(self, c):
+        """Return whether the expression is known to be an int in the loop."""
+        return False
+
+    def jit_exec(self, c):
+        """Emit with c the Python statements executing a statement."""
+        raise CannotCompile()
+
+    def eval(self, interp, local_var_env):
+        """Evaluate the AST node, called on nodes of expression subclasses.
+        interp: the Interpreter running the program.
+        local_var_env: mapping of local variables to values.
+        """
         raise Exception("Not implemented.")
 
-    def exec(self, local_var_env, is_global):
+    def exec(self, interp, local_var_env, is_global):
         """Evaluate the AST node, called on nodes of statement subclasses.
+        interp: the Interpreter running the program.
         local_var_env: mapping of local variables to values.
         is_global: whether the current scope is global
         """
         raise Exception("Not implemented.")
 
+    async def aexec(self, interp, local_var_env, is_global):
+        """Execute the statement as a coroutine that yields to the event loop
+        every interp.slice_steps loop iterations and procedure calls.
+        Statements without nested statements never yield.
+        """
+        self.exec(interp, local_var_env, is_global)
+
 # subclasses of Node for expressions
 
 class Var(Node):
     """Class of nodes representing accesses of variable."""
     fields = ['name']
+
+    def static_type(self, types): return types.get(self.name, BOTTOM)
+
+    def jit_eval(self, c):
+        v = c.local(self.name)
+        if self.name in c.undefined:
+            c.emit('if %s is None: raise EvalError()' % v)
+        return v
+
+    def jit_int(self, c): return self.name in c.ints
     
-    def eval(self,local_var_env):
+    def eval(self, interp, local_var_env):
         if self.name in local_var_env:
             return local_var_env[self.name]
-        elif self.name in global_var_env:
-            return global_var_env[self.name]
+        elif self.name in interp.global_var_env:
+            return interp.global_var_env[self.name]
         else:
             raise EvalError()
-#Is it okay to access local_var_env globally like this?
-#    
+
 class Int(Node):
     """Class of nodes representing integer literals."""
     fields = ['value']
+
+    def static_type(self, types): return int
+
+    def jit_eval(self, c): return repr(self.value)
+
+    def jit_int(self, c): return True
     
-    def eval(self,local_var_env): return self.value
+    def eval(self, interp, local_var_env): return self.value
 
 class String(Node):
     """Class of nodes representing string literals."""
     fields = ['value']
+
+    def static_type(self, types): return str
+
+    def jit_eval(self, c): return repr(self.value)
     
-    def eval(self,local_var_env): return self.value
+    def eval(self, interp, local_var_env): return self.value
 
 class Array(Node):
     """Class of nodes representing array literals."""
     fields = ['elements']
 
-    def eval(self,local_var_env): return [e.eval(local_var_env) for e in self.elements]
+    def jit_eval(self, c):
+        v = [e.jit_eval(c) for e in self.elements]
+        t = c.temp()
+        c.emit('%s = [%s]' % (t, ', '.join(v)))
+        c.emit('interp.alloc(%d)' % (56 + 8 * len(v)))
+        return t
+
+    def eval(self, interp, local_var_env):
+        v = [e.eval(interp, local_var_env) for e in self.elements]
+        interp.alloc(56 + 8 * len(v))
+        return v
         
 class Index(Node):
     """Class of nodes representing indexed accesses of arrays or strings."""
     fields = ['indexable', 'index']
 
-    def eval(self,local_var_env):
-        v1 = self.indexable.eval(local_var_env)
-        v2 = self.index.eval(local_var_env)
+    def static_type(self, types):
+        # Characters of strings are strings; elements of arrays may be anything.
+        t = self.indexable.static_type(types)
+        return t if t is BOTTOM or t is str else ANY
+
+    def jit_eval(self, c):
+        v1 = self.indexable.jit_eval(c)
+        v2 = self.index.jit_eval(c)
+        t = c.temp()
+        c.emit('%s = %s' % (t, v1))
+        c.emit('if isinstance(%s,Rope): %s = str(%s)' % (t, t, t))
+        c.emit('if not isinstance(%s,SEQUENCES): raise EvalError()' % t)
+        if not self.index.jit_int(c):
+            c.emit('if not isinstance(%s,int): raise EvalError()' % v2)
+        c.emit('if %s >= len(%s): raise EvalError()' % (v2, t))
+        c.emit('%s = %s[%s]' % (t, t, v2))
+        return t
 
-        if not isinstance(v1,(str,list)): raise EvalError()
+    def eval(self, interp, local_var_env):
+        v1 = self.indexable.eval(interp, local_var_env)
+        v2 = self.index.eval(interp, local_var_env)
+
+        if isinstance(v1,Rope): v1 = str(v1)
+        if not isinstance(v1,SEQUENCES): raise EvalError()
         if not isinstance(v2,int): raise EvalError()
         if v2 >= len(v1): raise EvalError()
 
         return v1[v2]
 
+class Slice(Node):
+    """Class of nodes representing slices of arrays or strings, a[i:j].
+    start and stop are None when omitted.
+    """
+    fields = ['indexable', 'start', 'stop']
+
+    def static_type(self, types):
+        t = self.indexable.static_type(types)
+        return t if t is BOTTOM or t is str else ANY
+
+    def jit_eval(self, c):
+        v1 = self.indexable.jit_eval(c)
+        v2 = 'None' if self.start is None else self.start.jit_eval(c)
+        v3 = 'None' if self.stop is None else self.stop.jit_eval(c)
+        t = c.temp()
+        c.emit('%s = slice_value(interp, %s, %s, %s)' % (t, v1, v2, v3))
+        return t
+
+    def eval(self, interp, local_var_env):
+        v1 = self.indexable.eval(interp, local_var_env)
+        v2 = None if self.start is None else self.start.eval(interp, local_var_env)
+        v3 = None if self.stop is None else self.stop.eval(interp, local_var_env)
+        return slice_value(interp, v1, v2, v3)
+
 class BinOpExp(Node):
     """Class of nodes representing binary-operation expressions."""
     fields = ['left', 'op', 'right']
+
+    def static_type(self, types):
+        if self.op != '+': return int
+        t1, t2 = self.left.static_type(types), self.right.static_type(types)
+        if proven(t1, int) and proven(t2, int): return join_types(t1, t2)
+        if proven(t1, str) and proven(t2, str): return join_types(t1, t2)
+        # Either an int or a str, or an evaluation error
+        return ANY
+
+    def specialize(self, types):
+        Node.specialize(self, types)
+        t1, t2 = self.left.static_type(types), self.right.static_type(types)
+        if proven(t1, int) and proven(t2, int):
+            return INT_OPS[self.op](self.left, self.op, self.right)
+        if self.op == '+' and proven(t1, str) and proven(t2, str):
+            return StrAdd(self.left, self.op, self.right)
+        return self
+
+    # Whether eval checks the types of the operands, False when they are proven.
+    checked = True
+
+    def jit_int(self, c):
+        if self.op != '+' or not self.checked: return not isinstance(self, StrAdd)
+        # An int plus anything else than an int is an error.
+        return self.left.jit_int(c) or self.right.jit_int(c)
+
+    def jit_operands(self, c):
+        """Emit the evaluation of both operands, checking that they are ints
+        unless that is known, and return the names holding them.
+        """
+        v1, v2 = self.left.jit_eval(c), self.right.jit_eval(c)
+        if self.checked:
+            if not self.left.jit_int(c):
+                c.emit('if not isinstance(%s,int): raise EvalError()' % v1)
+            if not self.right.jit_int(c):
+                c.emit('if not isinstance(%s,int): raise EvalError()' % v2)
+        return v1, v2
+
+    def jit_eval(self, c):
+        t = c.temp()
+        if self.op == '+' and (isinstance(self, StrAdd) or not self.jit_int(c)):
+            v1, v2 = self.left.jit_eval(c), self.right.jit_eval(c)
+            if not isinstance(self, StrAdd):
+                c.emit('if isinstance(%s,int) and isinstance(%s,int): %s = %s + %s' % (v1, v2, t, v1, v2))
+                c.emit('elif isinstance(%s,STRINGS) and isinstance(%s,STRINGS):' % (v1, v2))
+                c.emit('    interp.alloc(min(len(%s), len(%s)))' % (v1, v2))
+                c.emit('    %s = concat(%s, %s)' % (t, v1, v2))
+                c.emit('else: raise EvalError()')
+            else:
+                c.emit('interp.alloc(min(len(%s), len(%s)))' % (v1, v2))
+                c.emit('%s = concat(%s, %s)' % (t, v1, v2))
+            return t
+        v1, v2 = self.jit_operands(c)
+        if self.op in ('+', '-', '*'):
+            c.emit('%s = %s %s %s' % (t, v1, self.op, v2))
+        elif self.op == '/':
+            c.emit('if %s ==0: raise EvalError()' % v2)
+            c.emit('%s = int(%s / %s)' % (t, v1, v2))
+        else:
+            c.emit('%s = 1 if %s %s %s else 0' % (t, v1, self.op, v2))
+        return t
+
+    def jit_truth(self, c):
+        if self.op not in ('==', '<', '>'): return Node.jit_truth(self, c)
+        v1, v2 = self.jit_operands(c)
+        return '%s %s %s' % (v1, self.op, v2)
     
-    def eval(self,local_var_env):
-        v1 = self.left.eval(local_var_env)
-        v2 = self.right.eval(local_var_env)
+    def eval(self, interp, local_var_env):
+        v1 = self.left.eval(interp, local_var_env)
+        v2 = self.right.eval(interp, local_var_env)
 
         if self.op == '+': 
             if isinstance(v1,int) and isinstance(v2,int): return v1 + v2
-            if isinstance(v1,str) and isinstance(v2,str): return v1 + v2
+            if isinstance(v1,STRINGS) and isinstance(v2,STRINGS):
+                # The longer operand is usually dropped, as in s = s + "x".
+                interp.alloc(min(len(v1), len(v2)))
+                return concat(v1, v2)
             raise EvalError()
 
         if not isinstance(v1,int): raise EvalError()
@@ -110,16 +591,223 @@ class BinOpExp(Node):
         if self.op == 'and': return 1 if v1 and v2 else 0
         if self.op == 'or':  return 1 if v1 or v2 else 0
 
+# Binary operations on operands proven to be ints, or strs for StrAdd, by
+# type inference: they skip the type checks of BinOpExp, and nothing else.
+
+class IntAdd(BinOpExp):
+    def eval(self, interp, local_var_env):
+        return self.left.eval(interp, local_var_env) + self.right.eval(interp, local_var_env)
+
+class IntSub(BinOpExp):
+    def eval(self, interp, local_var_env):
+        return self.left.eval(interp, local_var_env) - self.right.eval(interp, local_var_env)
+
+class IntMul(BinOpExp):
+    def eval(self, interp, local_var_env):
+        return self.left.eval(interp, local_var_env) * self.right.eval(interp, local_var_env)
+
+class IntDiv(BinOpExp):
+    def eval(self, interp, local_var_env):
+        v1 = self.left.eval(interp, local_var_env)
+        v2 = self.right.eval(interp, local_var_env)
+        if v2 ==0: raise EvalError()
+        return int(v1 / v2)
+
+class IntEq(BinOpExp):
+    def eval(self, interp, local_var_env):
+        return 1 if self.left.eval(interp, local_var_env) == self.right.eval(interp, local_var_env) else 0
+
+    def truth(self, interp, local_var_env):
+        return self.left.eval(interp, local_var_env) == self.right.eval(interp, local_var_env)
+
+class IntLt(BinOpExp):
+    def eval(self, interp, local_var_env):
+        return 1 if self.left.eval(interp, local_var_env) < self.right.eval(interp, local_var_env) else 0
+
+    def truth(self, interp, local_var_env):
+        return self.left.eval(interp, local_var_env) < self.right.eval(interp, local_var_env)
+
+class IntGt(BinOpExp):
+    def eval(self, interp, local_var_env):
+        return 1 if self.left.eval(interp, local_var_env) > self.right.eval(interp, local_var_env) else 0
+
+    def truth(self, interp, local_var_env):
+        return self.left.eval(interp, local_var_env) > self.right.eval(interp, local_var_env)
+
+class IntAnd(BinOpExp):
+    def eval(self, interp, local_var_env):
+        v1 = self.left.eval(interp, local_var_env)
+        v2 = self.right.eval(interp, local_var_env)
+        return 1 if v1 and v2 else 0
+
+class IntOr(BinOpExp):
+    def eval(self, interp, local_var_env):
+        v1 = self.left.eval(interp, local_var_env)
+        v2 = self.right.eval(interp, local_var_env)
+        return 1 if v1 or v2 else 0
+
+class StrAdd(BinOpExp):
+    def eval(self, interp, local_var_env):
+        v1 = self.left.eval(interp, local_var_env)
+        v2 = self.right.eval(interp, local_var_env)
+        interp.alloc(min(len(v1), len(v2)))
+        return concat(v1, v2)
+
+INT_OPS = {'+': IntAdd, '-': IntSub, '*': IntMul, '/': IntDiv,
+           '==': IntEq, '<': IntLt, '>': IntGt, 'and': IntAnd, 'or': IntOr}
+
+for cls in list(INT_OPS.values()) + [StrAdd]: cls.checked = False
+
+class And(BinOpExp):
+    """Class of nodes representing short-circuit and: the right operand is
+    only evaluated when the left one is not 0.
+    """
+
+    def specialize(self, types):
+        Node.specialize(self, types)
+        if proven(self.left.static_type(types), int) and proven(self.right.static_type(types), int):
+            return IntAndThen(self.left, self.op, self.right)
+        return self
+
+    def jit_int(self, c): return True
+
+    def jit_eval(self, c):
+        t = c.temp()
+        c.emit('%s = 1 if %s else 0' % (t, self.jit_truth(c)))
+        return t
+
+    def jit_truth(self, c):
+        t = c.temp()
+        c.emit('%s = False' % t)
+        c.emit('if %s:' % c.operand_truth(self.left, self.checked))
+        c.indent()
+        c.emit('%s = %s' % (t, c.operand_truth(self.right, self.checked)))
+        c.dedent()
+        return t
+
+    def eval(self, interp, local_var_env):
+        return 1 if self.truth(interp, local_var_env) else 0
+
+    def truth(self, interp, local_var_env):
+        v1 = self.left.eval(interp, local_var_env)
+        if not isinstance(v1,int): raise EvalError()
+        if not v1: return False
+        v2 = self.right.eval(interp, local_var_env)
+        if not isinstance(v2,int): raise EvalError()
+        return v2 != 0
+
+class Or(BinOpExp):
+    """Class of nodes representing short-circuit or: the right operand is
+    only evaluated when the left one is 0.
+    """
+
+    def specialize(self, types):
+        Node.specialize(self, types)
+        if proven(self.left.static_type(types), int) and proven(self.right.static_type(types), int):
+            return IntOrElse(self.left, self.op, self.right)
+        return self
+
+    def jit_int(self, c): return True
+
+    def jit_eval(self, c):
+        t = c.temp()
+        c.emit('%s = 1 if %s else 0' % (t, self.jit_truth(c)))
+        return t
+
+    def jit_truth(self, c):
+        t = c.temp()
+        c.emit('%s = True' % t)
+        c.emit('if not (%s):' % c.operand_truth(self.left, self.checked))
+        c.indent()
+        c.emit('%s = %s' % (t, c.operand_truth(self.right, self.checked)))
+        c.dedent()
+        return t
+
+    def eval(self, interp, local_var_env):
+        return 1 if self.truth(interp, local_var_env) else 0
+
+    def truth(self, interp, local_var_env):
+        v1 = self.left.eval(interp, local_var_env)
+        if not isinstance(v1,int): raise EvalError()
+        if v1: return True
+        v2 = self.right.eval(interp, local_var_env)
+        if not isinstance(v2,int): raise EvalError()
+        return v2 != 0
+
+class IntAndThen(And):
+    checked = False
+
+    def truth(self, interp, local_var_env):
+        return self.left.truth(interp, local_var_env) and self.right.truth(interp, local_var_env)
+
+class IntOrElse(Or):
+    checked = False
+
+    def truth(self, interp, local_var_env):
+        return self.left.truth(interp, local_var_env) or self.right.truth(interp, local_var_env)
+
 class UniOpExp(Node):
     """Class of nodes representing unary-operation expressions."""
     fields = ['op', 'arg']
 
-    def eval(self,local_var_env):
-        v = self.arg.eval(local_var_env)
+    def static_type(self, types): return int
+
+    def specialize(self, types):
+        Node.specialize(self, types)
+        if self.op == 'not' and proven(self.arg.static_type(types), int):
+            return IntNot(self.op, self.arg)
+        return self
+
+    def jit_int(self, c): return True
+
+    def jit_eval(self, c):
+        t = c.temp()
+        c.emit('%s = 0 if %s else 1' % (t, c.operand_truth(self.arg, not isinstance(self, IntNot))))
+        return t
+
+    def jit_truth(self, c):
+        return 'not (%s)' % c.operand_truth(self.arg, not isinstance(self, IntNot))
+
+    def eval(self, interp, local_var_env):
+        v = self.arg.eval(interp, local_var_env)
         if not isinstance(v,int): raise EvalError()
 
         if self.op == 'not': return 0 if v else 1
 
+class IntNot(UniOpExp):
+    def eval(self, interp, local_var_env):
+        return 0 if self.arg.truth(interp, local_var_env) else 1
+
+    def truth(self, interp, local_var_env):
+        return not self.arg.truth(interp, local_var_env)
+
+class Hoisted(Node):
+    """Class of nodes wrapping an expression invariant in a loop.
+
+    The expression is evaluated where it is first used in an execution of
+    the loop, so it fails exactly where it would have, and its value is then
+    kept in the local variables under the node itself until the loop is
+    entered again.
+    """
+    fields = ['exp']
+
+    def size(self): return self.exp.size()
+
+    def static_type(self, types): return self.exp.static_type(types)
+
+    def jit_eval(self, c): return self.exp.jit_eval(c)
+
+    def jit_truth(self, c): return self.exp.jit_truth(c)
+
+    def jit_int(self, c): return self.exp.jit_int(c)
+
+    def eval(self, interp, local_var_env):
+        try:
+            return local_var_env[self]
+        except KeyError:
+            v = local_var_env[self] = self.exp.eval(interp, local_var_env)
+            return v
+
 # subclasses of Node for statements
 
 class Print(Node):
@@ -127,99 +815,303 @@ class Print(Node):
     
     fields = ['exp']
 
-    def anlz_procs(self): pass
+    def anlz_procs(self, proc_env): pass
+
+    def exec(self, interp, local_var_env, is_global):
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        interp.write(repr(self.exp.eval(interp, local_var_env)))
+
+    def jit_exec(self, c):
+        c.charge(self.cost)
+        c.emit('interp.write(repr(%s))' % self.exp.jit_eval(c))
 
-    def exec(self, local_var_env, is_global):
-        print(repr(self.exp.eval(local_var_env)))
-#I'm printing out a, but a=4. Find a way to print value 
 class Assign(Node):
     """Class of nodes representing assignment statements."""
     fields = ['left', 'right']
     
-    def anlz_procs(self): pass
+    def anlz_procs(self, proc_env): pass
+
+    def anlz_types(self, types, proc_env):
+        # Stores into arrays leave the type of the variable unchanged.
+        if isinstance(self.left, Var):
+            name = self.left.name
+            types[name] = join_types(types.get(name, BOTTOM), self.right.static_type(types))
+
+    def jit_exec(self, c):
+        if isinstance(self.left, Var):
+            c.charge(self.cost)
+            c.emit('%s = %s' % (c.local(self.left.name), self.right.jit_eval(c)))
+        elif isinstance(self.left, Index) and isinstance(self.left.indexable, Var):
+            # As exec: the index is evaluated twice, the value in between.
+            c.charge(self.cost)
+            a = self.left.indexable.jit_eval(c)
+            c.emit('if %s >= len(%s): raise EvalError()' % (self.left.index.jit_eval(c), a))
+            v = self.right.jit_eval(c)
+            i = self.left.index.jit_eval(c)
+            c.emit('if interp.views or %s.__class__ is not list: interp.store(%s, %s, %s)' % (a, a, i, v))
+            c.emit('else: %s[%s] = %s' % (a, i, v))
+        else:
+            raise CannotCompile()
     
-    def exec(self, local_var_env, is_global):
+    def exec(self, interp, local_var_env, is_global):
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        global_var_env = interp.global_var_env
         if(is_global):
             if(isinstance(self.left,Var)):
-                global_var_env[self.left.name] = self.right.eval(local_var_env)
+                global_var_env[self.left.name] = self.right.eval(interp, local_var_env)
             elif(isinstance(self.left,Index)):
-                if self.left.indexable.name not in global_var_env or self.left.index.eval(local_var_env) >= len(global_var_env[self.left.indexable.name]):
+                if self.left.indexable.name not in global_var_env or self.left.index.eval(interp, local_var_env) >= len(global_var_env[self.left.indexable.name]):
                     raise EvalError()
                 else:
-                    global_var_env[self.left.indexable.name][self.left.index.eval(local_var_env)] = self.right.eval(local_var_env)
+                    self.store(interp, global_var_env, local_var_env)
         else:
             if(isinstance(self.left,Var)):
-                local_var_env[self.left.name] = self.right.eval(local_var_env)
+                local_var_env[self.left.name] = self.right.eval(interp, local_var_env)
             elif(isinstance(self.left,Index)):
                 if  self.left.indexable.name in local_var_env:
-                    if  self.left.index.eval(local_var_env) >= len(local_var_env[self.left.indexable.name]):
+                    if  self.left.index.eval(interp, local_var_env) >= len(local_var_env[self.left.indexable.name]):
                         raise EvalError()
-                    local_var_env[self.left.indexable.name][self.left.index.eval(local_var_env)] = self.right.eval(local_var_env)
+                    self.store(interp, local_var_env, local_var_env)
                 elif self.left.indexable.name in global_var_env:
-                    if self.left.index.eval(local_var_env) >= len(global_var_env[self.left.indexable.name]):
+                    if self.left.index.eval(interp, local_var_env) >= len(global_var_env[self.left.indexable.name]):
                         raise EvalError()
-                    global_var_env[self.left.indexable.name][self.left.index.eval(local_var_env)] = self.right.eval(local_var_env)
+                    self.store(interp, global_var_env, local_var_env)
                 else:
                     raise EvalError()
-               #  if self.left.indexable.name not in global_var_env or self.left.indexable.name not in local_var_env or self.left.index.eval(local_var_env) >= len(local_var_env[self.left.indexable.name]):
-#                     raise EvalError()
-#                 else:
-#                     local_var_env[self.left.indexable.name][self.left.index.eval(local_var_env)] = self.right.eval(local_var_env)
+
+    def store(self, interp, env, local_var_env):
+        """Store the value into the array of env, once its index is checked."""
+        value = self.right.eval(interp, local_var_env)
+        index = self.left.index.eval(interp, local_var_env)
+        array = env[self.left.indexable.name]
+        if interp.views or array.__class__ is not list:
+            interp.store(array, index, value)
+        else:
+            array[index] = value
+
+    def specialize_stores(self, is_global):
+        if isinstance(self.left, Var):
+            cls = GlobalAssign if is_global else LocalAssign
+        elif isinstance(self.left, Index) and isinstance(self.left.indexable, Var):
+            cls = IndexAssign
+        else:
+            return self
+        if type(self) is cls: return self
+        node = cls(self.left, self.right)
+        node.line, node.column, node.cost = self.line, self.column, self.cost
+        return node
+
+# Assignments are specialized once the scope of every statement is known, see
+# Interpreter.analyze, so they only test what depends on the values at hand.
+
+class LocalAssign(Assign):
+    """Class of nodes representing assignments of variables in procedures."""
+
+    def exec(self, interp, local_var_env, is_global):
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        local_var_env[self.left.name] = self.right.eval(interp, local_var_env)
+
+class GlobalAssign(Assign):
+    """Class of nodes representing assignments of variables outside of
+    procedures.
+    """
+
+    def exec(self, interp, local_var_env, is_global):
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        interp.global_var_env[self.left.name] = self.right.eval(interp, local_var_env)
+
+class IndexAssign(Assign):
+    """Class of nodes representing stores into elements of arrays held by
+    variables.
+
+    Outside of procedures no variable is local, so looking up the local
+    variables first, as procedures do, finds the same array.
+    """
+
+    def exec(self, interp, local_var_env, is_global):
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        name = self.left.indexable.name
+        if name in local_var_env:
+            env = local_var_env
+        else:
+            env = interp.global_var_env
+            if name not in env: raise EvalError()
+        if self.left.index.eval(interp, local_var_env) >= len(env[name]):
+            raise EvalError()
+        self.store(interp, env, local_var_env)
 
 class Block(Node):
     """Class of nodes representing block statements."""
     fields = ['stmts']
 
-    def anlz_procs(self):
-        for s in self.stmts: s.anlz_procs()
+    def anlz_procs(self, proc_env):
+        for s in self.stmts: s.anlz_procs(proc_env)
+
+    def anlz_costs(self):
+        for s in self.stmts: s.anlz_costs()
+
+    def anlz_types(self, types, proc_env):
+        for s in self.stmts: s.anlz_types(types, proc_env)
+
+    def specialize_stores(self, is_global):
+        self.stmts = [s.specialize_stores(is_global) for s in self.stmts]
+        return self
+
+    def jit_exec(self, c):
+        for s in self.stmts: s.jit_exec(c)
     
-    def exec(self, local_var_env, is_global):
+    def exec(self, interp, local_var_env, is_global):
+        for s in self.stmts:
+            s.exec(interp, local_var_env, is_global)
+
+    async def aexec(self, interp, local_var_env, is_global):
         for s in self.stmts:
-            s.exec(local_var_env, is_global)
-            #pdb.set_trace()
+            await s.aexec(interp, local_var_env, is_global)
 
 class If(Node):
     """Class of nodes representing if statements."""
     fields = ['exp', 'stmt']
 
-    def anlz_procs(self): self.stmt.anlz_procs()
+    def anlz_procs(self, proc_env): self.stmt.anlz_procs(proc_env)
+
+    def anlz_costs(self):
+        self.cost = 1 + self.exp.size()
+        self.stmt.anlz_costs()
+
+    def anlz_types(self, types, proc_env): self.stmt.anlz_types(types, proc_env)
+
+    def specialize_stores(self, is_global):
+        self.stmt = self.stmt.specialize_stores(is_global)
+        return self
+
+    def jit_exec(self, c):
+        c.charge(self.cost)
+        c.emit('if %s:' % self.exp.jit_truth(c))
+        c.indent()
+        self.stmt.jit_exec(c)
+        c.dedent()
     
-    def exec(self, local_var_env, is_global):
-        if(self.exp.eval(local_var_env) != 0):
-            self.stmt.exec(local_var_env,is_global)
+    def exec(self, interp, local_var_env, is_global):
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        if self.exp.truth(interp, local_var_env):
+            self.stmt.exec(interp, local_var_env, is_global)
+
+    async def aexec(self, interp, local_var_env, is_global):
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        if self.exp.truth(interp, local_var_env):
+            await self.stmt.aexec(interp, local_var_env, is_global)
 
 class While(Node):
     """Class of nodes representing while statements."""
     fields = ['exp', 'stmt']
 
-    def anlz_procs(self): self.stmt.anlz_procs()
+    # Hoisted expressions of the loop, see HoistingWhile
+    hoisted = ()
+
+    def anlz_procs(self, proc_env): self.stmt.anlz_procs(proc_env)
+
+    def anlz_costs(self):
+        self.cost = 1 + self.exp.size()
+        self.stmt.anlz_costs()
+
+    def anlz_types(self, types, proc_env): self.stmt.anlz_types(types, proc_env)
+
+    def specialize_stores(self, is_global):
+        self.stmt = self.stmt.specialize_stores(is_global)
+        return self
+
+    def jit_exec(self, c):
+        c.emit('while True:')
+        c.indent()
+        c.emit('if not (%s): break' % self.exp.jit_truth(c))
+        c.charge(self.cost)
+        self.stmt.jit_exec(c)
+        c.dedent()
     
-    def exec(self, local_var_env, is_global):
-        while(self.exp.eval(local_var_env) != 0):
-            self.stmt.exec(local_var_env, is_global)
+    def exec(self, interp, local_var_env, is_global):
+        # hot: iterations left before the loop is compiled, or its CompiledLoop,
+        # or None when it is not compiled.
+        hot = interp.loops.get(self, interp.jit_threshold)
+        if hot is not None and not isinstance(hot, int):
+            if hot.run(interp, local_var_env, is_global): return
+            hot = None
+        # Compiled loops evaluate invariants themselves.
+        for h in self.hoisted: local_var_env.pop(h, None)
+        while self.exp.truth(interp, local_var_env):
+            interp.steps_left -= self.cost
+            if interp.steps_left < 0: raise LimitError('Steps')
+            self.stmt.exec(interp, local_var_env, is_global)
+            if hot is not None:
+                hot -= 1
+                if hot <= 0:
+                    # Go on with the compiled loop, from the next condition.
+                    hot = interp.tier_up(self, local_var_env, is_global)
+                    if hot is not None and hot.run(interp, local_var_env, is_global): return
+                    hot = None
+        if hot is not None: interp.loops[self] = hot
+
+    async def aexec(self, interp, local_var_env, is_global):
+        for h in self.hoisted: local_var_env.pop(h, None)
+        while self.exp.truth(interp, local_var_env):
+            interp.steps_left -= self.cost
+            if interp.steps_left < 0: raise LimitError('Steps')
+            await self.stmt.aexec(interp, local_var_env, is_global)
+            interp.ticks -= 1
+            if interp.ticks <= 0: await interp.pause()
+
+class HoistingWhile(While):
+    """Class of nodes representing while statements with loop-invariant
+    expressions, whose values are forgotten each time the loop is entered.
+    """
+    fields = ['exp', 'stmt', 'hoisted']
+    label = 'While'
 
 class Def(Node):
     """Class of nodes representing procedure definitions."""
     fields = ['name', 'params', 'body']
 
-    def anlz_procs(self):
+    def anlz_procs(self, proc_env):
+        # Proc must not have been defined previously
         if self.name in proc_env:
             raise EvalError()
         proc_env[self.name] = (self.params, self.body)
-        self.body.anlz_procs()
+        self.body.anlz_procs(proc_env)
+
+    def anlz_costs(self): self.body.anlz_costs()
+
+    def anlz_types(self, types, proc_env): self.body.anlz_types(types, proc_env)
+
+    # Bodies of procedures only run in calls.
+    def specialize_stores(self, is_global):
+        self.body = self.body.specialize_stores(False)
+        return self
         
-    def exec(self, local_var_env, is_global):
+    def exec(self, interp, local_var_env, is_global):
         pass
-#Does Def need an exec? 
-#Proc must not have been defined previously
 
 class Call(Node):
     """Class of nodes representing precedure calls."""
     fields = ['name', 'args']
 
-    def anlz_procs(self): pass
+    def anlz_procs(self, proc_env): pass
+
+    def anlz_types(self, types, proc_env):
+        if self.name in proc_env and len(proc_env[self.name][0]) == len(self.args):
+            for x, y in zip(proc_env[self.name][0], self.args):
+                types[x] = join_types(types.get(x, BOTTOM), y.static_type(types))
     
-    def exec(self, local_var_env, is_global):
+    def frame(self, interp, local_var_env):
+        """Return the body of the called procedure and its local variables."""
+        interp.steps_left -= self.cost
+        if interp.steps_left < 0: raise LimitError('Steps')
+        proc_env = interp.proc_env
         localVars={}
         for i in local_var_env:
             localVars[i] = local_var_env[i]
@@ -227,15 +1119,208 @@ class Call(Node):
             raise EvalError()
         assert(len(proc_env[self.name][0]) == len(self.args))
         for x,y in zip(proc_env[self.name][0],self.args):
-            #local_var_env[x]=y.eval()
-            localVars[x] = y.eval(local_var_env)
-        #proc_env[self.name][1].exec(local_var_env,is_global)
-        proc_env[self.name][1].exec(localVars,False)
-#Shouldn't I pass false for                       -- ^  ?           
-#Function called, params belong in local
-#Var in body of function belong in local        
-#Var used in body of function, if not in local then in global, else error
-#
+            localVars[x] = y.eval(interp, local_var_env)
+        return proc_env[self.name][1], localVars
+
+    def exec(self, interp, local_var_env, is_global):
+        body, localVars = self.frame(interp, local_var_env)
+        names = interp.pure_procs.get(self.name) if interp.memo_size else None
+        if names is not None:
+            interp.call_pure(body, names, localVars)
+            return
+        # Params and variables assigned in the body of the procedure are local
+        body.exec(interp, localVars, False)
+
+    async def aexec(self, interp, local_var_env, is_global):
+        body, localVars = self.frame(interp, local_var_env)
+        interp.ticks -= 1
+        if interp.ticks <= 0: await interp.pause()
+        await body.aexec(interp, localVars, False)
+
+# Hot loops are compiled to Python functions, in the way TPG compiles the
+# parsers it generates: the source of the function is generated, then exec'd.
+
+class CannotCompile(Exception):
+    """Class of exceptions raised when a loop contains nodes that cannot be
+    compiled, such as procedure calls.
+    """
+
+class LoopCompiler(object):
+    """Compile a While loop to a Python function, for a given environment.
+
+    Every variable of the loop becomes a Python local, loaded at entry and
+    stored back at exit, and variables holding ints at entry, and only
+    assigned ints in the loop, are known to be ints, so their operations
+    skip type checks.  The function starts with guards checking these
+    assumptions: it returns False, before running anything, when the
+    variables do not resolve to the same environments or the ints are no
+    longer ints, and the loop then runs in the tree interpreter.
+
+    The compiled loop charges the same steps, evaluates the same
+    expressions in the same order and raises the same errors as the tree
+    interpreter would.
+    """
+
+    def __init__(self, loop, local_var_env, global_var_env, is_global):
+        self.lines = []
+        self.depth = 1
+        self.temps = 0
+        self.is_global = is_global
+        names, assigns = set(), []
+        self.scan(loop, names, assigns)
+        written = set(name for name, exp in assigns)
+        # where: environment each variable resolves to at entry, None if none
+        self.where = {}
+        for name in names:
+            if name in local_var_env: self.where[name] = 'L'
+            elif name in global_var_env: self.where[name] = 'G'
+            else: self.where[name] = None
+        env = global_var_env if is_global else local_var_env
+        # Variables not resolved at entry, and assigned in the loop, raise
+        # EvalError until they are first assigned.
+        self.undefined = set(n for n in written if self.where[n] is None)
+        self.ints = set(n for n in names if self.where[n] is not None
+                        and isinstance(env.get(n, global_var_env.get(n)), int))
+        self.ints -= self.undefined
+        changed = True
+        while changed:
+            changed = False
+            for name, exp in assigns:
+                if name in self.ints and not exp.jit_int(self):
+                    self.ints.discard(name)
+                    changed = True
+        self.possible = all(self.where[n] is not None or n in written for n in names)
+        if not is_global:
+            # Assignments in procedures would hide a global variable.
+            self.possible = self.possible and all(self.where[n] != 'G' for n in written)
+        self.names = sorted(names)
+        # locals: map from variables to the Python locals holding them.
+        # Python normalizes identifiers (NFKC), so distinct variable names
+        # may be the same identifier: locals are numbered instead.
+        self.locals = dict((name, 'v%d' % i) for i, name in enumerate(self.names))
+        self.written = written
+        self.loop = loop
+
+    def scan(self, node, names, assigns):
+        """Collect the variables of node, and the expressions assigned to them."""
+        if isinstance(node, Var):
+            names.add(node.name)
+        elif isinstance(node, Assign) and isinstance(node.left, Var):
+            assigns.append((node.left.name, node.right))
+        for c in node.children(): self.scan(c, names, assigns)
+
+    def local(self, name):
+        """Return the Python local holding the variable name."""
+        return self.locals[name]
+
+    def emit(self, line):
+        self.lines.append('    ' * self.depth + line)
+
+    def indent(self):
+        self.depth += 1
+
+    def dedent(self):
+        self.emit('pass')
+        self.depth -= 1
+
+    def temp(self):
+        self.temps += 1
+        return 't%d' % self.temps
+
+    def charge(self, cost):
+        self.emit('steps -= %d' % cost)
+        self.emit("if steps < 0: raise LimitError('Steps')")
+
+    def operand_truth(self, exp, checked):
+        """Emit the evaluation of an operand of a logical operation, checking
+        that it is an int if checked, and return its truth.
+        """
+        if not checked or exp.jit_int(self): return exp.jit_truth(self)
+        v = exp.jit_eval(self)
+        self.emit('if not isinstance(%s,int): raise EvalError()' % v)
+        return v
+
+    def source(self):
+        """Return the source of the function running the loop."""
+        self.emit('if %sis_global: return False' % ('not ' if self.is_global else ''))
+        for name in self.names:
+            v, where = self.local(name), self.where[name]
+            if where == 'L':
+                self.emit("if %r not in L: return False" % name)
+                self.emit("%s = L[%r]" % (v, name))
+            elif where == 'G':
+                self.emit("if %r in L or %r not in G: return False" % (name, name))
+                self.emit("%s = G[%r]" % (v, name))
+            else:
+                self.emit("if %r in L or %r in G: return False" % (name, name))
+                self.emit("%s = None" % v)
+            if name in self.ints:
+                self.emit("if not isinstance(%s,int): return False" % v)
+        self.emit('steps = interp.steps_left')
+        self.emit('try:')
+        self.indent()
+        self.loop.jit_exec(self)
+        self.dedent()
+        self.emit('finally:')
+        self.indent()
+        self.emit('interp.steps_left = steps')
+        env = 'G' if self.is_global else 'L'
+        for name in sorted(self.written):
+            v = self.local(name)
+            if name in self.undefined:
+                self.emit('if %s is not None: %s[%r] = %s' % (v, env, name, v))
+            else:
+                self.emit('%s[%r] = %s' % (env, name, v))
+        self.dedent()
+        self.emit('return True')
+        return 'def loop(interp, L, G, is_global):\n' + '\n'.join(self.lines) + '\n'
+
+    def function(self):
+        """Return the function running the loop, called with the interpreter,
+        the local and global environments and is_global, or None if the
+        environment makes the loop impossible to compile.
+        """
+        source = self.source()
+        if not self.possible: return None
+        namespace = {'EvalError': EvalError, 'LimitError': LimitError,
+                     'Rope': Rope, 'STRINGS': STRINGS, 'concat': concat,
+                     'SEQUENCES': SEQUENCES, 'slice_value': slice_value}
+        try:
+            code = compile(source, '<loop at %s:%s>' % (self.loop.line, self.loop.column), 'exec')
+        except (SyntaxError, RecursionError, MemoryError):
+            # Too deeply nested for Python
+            raise CannotCompile()
+        exec(code, namespace)
+        loop = namespace['loop']
+        loop.source = source
+        return loop
+
+class CompiledLoop(object):
+    """Class of the compiled versions of a hot While loop.
+
+    A loop is compiled again, up to MAX_VERSIONS times, when it is entered
+    in an environment none of its versions was compiled for.
+    """
+
+    MAX_VERSIONS = 4
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.versions = []
+
+    def run(self, interp, local_var_env, is_global):
+        """Run the loop to its end and return True, or return False when no
+        version applies to the environment, having run nothing.
+        """
+        global_var_env = interp.global_var_env
+        for f in self.versions:
+            if f(interp, local_var_env, global_var_env, is_global): return True
+        if len(self.versions) >= self.MAX_VERSIONS: return False
+        f = LoopCompiler(self.loop, local_var_env, global_var_env, is_global).function()
+        if f is None: return False
+        self.versions.append(f)
+        return f(interp, local_var_env, global_var_env, is_global)
+
 class Parser(tpg.Parser):
     r"""
     token int:         '\d+' ;
@@ -246,7 +1331,7 @@ class Parser(tpg.Parser):
 
     START/s -> Stmt/s ;
 
-    Stmt/s ->
+    Stmt/s -> @t
     ( 'print' Exp/e ';'  $s = Print(e)$
     | Exp/l '=(?!=)' Exp/r ';'  $ s = Assign(l, r) $
     | '\{'  $ s=[] $  ( Stmt/s2  $ s.append(s2) $  )* '\}'  $s = Block(s)$
@@ -258,16 +1343,21 @@ class Parser(tpg.Parser):
     | ident/f '\('  $l=[]$  ( Exp/e  $l.append(e)$
                               ( ',' Exp/e  $l.append(e)$  )*)? '\)' ';'
       $s=Call(f,l)$
-    ) ;
+    )  $ self.at(s, t) $ ;
 
     Exp/e -> Or/e ;
-    Or/e  -> And/e ( 'or'  And/e2  $e=BinOpExp(e,'or', e2)$  )* ;
-    And/e -> Not/e ( 'and' Not/e2  $e=BinOpExp(e,'and',e2)$  )* ;
+    Or/e  -> And/e ( 'or'  And/e2  $e=self.logical(Or, e, 'or', e2)$  )* ;
+    And/e -> Not/e ( 'and' Not/e2  $e=self.logical(And, e, 'and', e2)$  )* ;
     Not/e -> 'not' Not/e  $e=UniOpExp('not', e)$  | Cmp/e ;
     Cmp/e -> Add/e ( CmpOp Add/e2  $e=BinOpExp(e,CmpOp,e2)$  )* ;
     Add/e -> Mul/e ( AddOp Mul/e2  $e=BinOpExp(e,AddOp,e2)$  )* ; 
     Mul/e -> Index/e ( MulOp Index/e2  $e=BinOpExp(e,MulOp,e2)$  )* ;
-    Index/e -> Atom/e ( '\[' Exp/e2 '\]'  $e=Index(e,e2)$  )* ;
+    Index/e -> Atom/e
+    ( '\['  ( Exp/e2  ( ':' Bound/e3  $e=Slice(e,e2,e3)$  |  $e=Index(e,e2)$  )
+           | ':' Bound/e3  $e=Slice(e,None,e3)$
+           )  '\]'
+    )* ;
+    Bound/e -> Exp/e | $e=None$ ;
     Atom/e -> '\(' Exp/e '\)'
     | int/i     $e=Int(int(i))$
     | string/s  $e=String(s[1:-1])$
@@ -280,52 +1370,471 @@ class Parser(tpg.Parser):
     MulOp/r -> '\*'/r | '/'/r ;
     """
 
+    # Whether "and" and "or" skip their right operand when the left one
+    # decides the result.  When False, both operands are always evaluated,
+    # as in the first versions of the language.
+    short_circuit = True
+
+    def at(self, node, token):
+        """Record the position of token as the position of node."""
+        node.line, node.column = self.line(token), self.column(token)
+
+    def logical(self, cls, left, op, right):
+        """Return the node of a logical operation, cls if short-circuit."""
+        return cls(left, op, right) if self.short_circuit else BinOpExp(left, op, right)
+
 def parse(code):
     # This makes a parser object, which acts as a parsing function.
     parser = Parser()
     return parser(code)
 
+class Program(object):
+    """Class of parsed and analyzed MustScript programs.
+
+    A program is never modified by running it, so one Program can be
+    executed many times, by any number of interpreters.
+    """
+
+    def __init__(self, node, proc_env, pure_procs=None):
+        self.node = node
+        self.proc_env = proc_env
+        self.pure_procs = {} if pure_procs is None else pure_procs
+
+# Value of variables not defined, in keys of memoized calls
+UNDEFINED = object()
+
+class Interpreter(object):
+    """Class of MustScript interpreters.
+
+    An interpreter owns its parser and the environments of the program it
+    runs, so several interpreters can live in one process (or one thread
+    each) without sharing state.
+
+    write: function called with the text of each printed value.
+    slice_steps: number of loop iterations and procedure calls after which
+                 programs executed as coroutines yield to the event loop.
+    max_steps: step budget of a run, None for no limit.  Statements, loop
+               iterations, calls and expression evaluations all cost steps.
+    max_alloc: allocation budget of a run, None for no limit: the approximate
+               number of bytes of arrays and strings it may allocate in
+               all, whether or not they are still held.
+    short_circuit: whether "and" and "or" of parsed programs skip their
+                   right operand when the left one decides the result.
+    jit_threshold: number of iterations after which a While loop is compiled
+                   to Python, None to never compile loops.
+    memo_size: number of calls remembered for each pure procedure, 0 to
+               never memoize calls.
+    """
+
+    def __init__(self, write=print, slice_steps=1000, max_steps=None, max_alloc=None,
+                 short_circuit=True, jit_threshold=100, memo_size=256):
+        self.parser = None
+        self.short_circuit = short_circuit
+        self.jit_threshold = jit_threshold
+        # loops: map from While nodes to the iterations left before they are
+        # compiled, their CompiledLoop, or None if they cannot be compiled
+        self.loops = {}
+        # pure_procs: map from names of pure procedures to the variables
+        #             their calls depend on, parameters first
+        # memos: map from bodies of pure procedures to their remembered calls
+        self.memo_size = memo_size
+        self.pure_procs = {}
+        self.memos = {}
+        self.memo_hits = self.memo_misses = 0
+        # views: map from ids of lists to the ArrayViews sharing them, see
+        #        share; pruned of lists without views when it reaches prune_at
+        self.views = {}
+        self.prune_at = 64
+        self.write = write
+        self.slice_steps = slice_steps
+        self.max_steps = max_steps
+        self.max_alloc = max_alloc
+        # steps_left: steps the running program may still take
+        # allocated: approximate number of bytes allocated by the running program
+        self.steps_left = self.allocated = 0
+        # proc_env: map from procedure names to their parameters and body
+        # global_var_env: map from global variable names to their values
+        self.proc_env = {}
+        self.global_var_env = {}
+        # ticks: steps left before the next yield to the event loop
+        # deadline: time.monotonic() value after which execution stops
+        self.ticks = slice_steps
+        self.deadline = None
+
+    def parse(self, code):
+        """Parse a MustScript program into an AST, raising tpg.Error."""
+        if self.parser is None:
+            self.parser = Parser()
+            self.parser.short_circuit = self.short_circuit
+        return self.parser(code)
+
+    def analyze(self, node):
+        """Collect procedure definitions in the program, raising EvalError,
+        then specialize the operations whose operand types are proven and
+        the assignments.  Return the analyzed program, which replaces node
+        when node itself is specialized.
+        """
+        self.proc_env = {}
+        node.anlz_procs(self.proc_env)
+        node = node.specialize(self.infer_types(node))
+        node = node.specialize_stores(True)
+        node.anlz_costs()
+        self.pure_procs = self.find_pure_procs()
+        node = self.hoist_invariants(node)
+        # Bodies of procedures may have been replaced.
+        self.proc_env = {}
+        node.anlz_procs(self.proc_env)
+        return node
+
+    def infer_types(self, node):
+        """Return the static type of every variable of the program.
+
+        Local variables are visible to called procedures, so a variable has
+        the type of all the values stored into any variable of that name.
+        The types are joined until they no longer change.
+        """
+        types, old = {}, None
+        while types != old:
+            old = dict(types)
+            node.anlz_types(types, self.proc_env)
+        return types
+
+    def hoist_invariants(self, node):
+        """Replace node, and the While loops below it, with HoistingWhile
+        loops, where they contain expressions invariant in the loop, and
+        return node or the loop replacing it.
+
+        A variable is invariant in a loop that does not assign it, since
+        procedures only assign their own local variables, and the elements of
+        arrays are invariant in a loop without stores into arrays or calls of
+        impure procedures.  Expressions that allocate memory, array literals
+        and string concatenations, are evaluated every time.  Loops are
+        processed outermost first, so invariants go to the outermost loop
+        they are invariant in.
+        """
+        if isinstance(node, While): node = self.hoist_loop(node)
+        self.hoist_below(node)
+        return node
+
+    def hoist_below(self, node):
+        """Replace the While loops below node, see hoist_invariants."""
+        for f in node.fields:
+            v = getattr(node, f)
+            if isinstance(v, While):
+                setattr(node, f, self.hoist_loop(v))
+            elif isinstance(v, list) and f != 'hoisted':
+                setattr(node, f, [self.hoist_loop(c) if isinstance(c, While) else c for c in v])
+        for c in node.children():
+            if not isinstance(c, Hoisted): self.hoist_below(c)
+
+    def hoist_loop(self, loop):
+        assigned, mutates, hoisted = set(), [False], []
+        # shared: map from shapes of hoisted expressions to their Hoisted node,
+        #         so equal expressions are evaluated once per loop execution
+        shared = {}
+
+        def shape(e):
+            if isinstance(e, Node):
+                return (type(e),) + tuple(shape(getattr(e, f)) for f in e.fields)
+            return e
+
+        def scan(node):
+            if isinstance(node, Def): return
+            if isinstance(node, Assign):
+                if isinstance(node.left, Var): assigned.add(node.left.name)
+                else: mutates[0] = True
+            elif isinstance(node, Call) and node.name not in self.pure_procs:
+                mutates[0] = True
+            for c in node.children(): scan(c)
+
+        def invariant(e):
+            if isinstance(e, (Int, String)): return True
+            if isinstance(e, Var): return e.name not in assigned
+            if isinstance(e, Index): return not mutates[0] and invariant(e.indexable) and invariant(e.index)
+            if isinstance(e, BinOpExp):
+                return (e.op != '+' or isinstance(e, IntAdd)) and invariant(e.left) and invariant(e.right)
+            if isinstance(e, UniOpExp): return invariant(e.arg)
+            return False
+
+        def hoist(node):
+            if isinstance(node, (Def, Hoisted, Int, String)): return node
+            if isinstance(node, (Var, Index, BinOpExp, UniOpExp)) and invariant(node):
+                key = shape(node)
+                if key not in shared:
+                    shared[key] = Hoisted(node)
+                    hoisted.append(shared[key])
+                return shared[key]
+            if isinstance(node, Assign):
+                # The target is not evaluated, only the index of an indexed one.
+                node.right = hoist(node.right)
+                if isinstance(node.left, Index): node.left.index = hoist(node.left.index)
+                return node
+            for f in node.fields:
+                v = getattr(node, f)
+                if isinstance(v, Node):
+                    setattr(node, f, hoist(v))
+                elif isinstance(v, list):
+                    setattr(node, f, [hoist(c) if isinstance(c, Node) else c for c in v])
+            return node
+
+        scan(loop)
+        loop.exp, loop.stmt = hoist(loop.exp), hoist(loop.stmt)
+        if not hoisted: return loop
+        node = HoistingWhile(loop.exp, loop.stmt, hoisted)
+        node.line, node.column, node.cost = loop.line, loop.column, loop.cost
+        return node
+
+    def find_pure_procs(self):
+        """Return the pure procedures of the program, mapped to the variables
+        their calls depend on.
+
+        Procedures return nothing and assign local variables only, so a
+        procedure is pure when it prints nothing, stores nothing into arrays
+        and only calls pure procedures: its calls then differ only in the
+        steps they take, the bytes they allocate and whether they raise
+        EvalError, which depend on nothing but the values of its parameters
+        and of the variables it and the procedures it calls read.
+        """
+        reads, calls, impure = {}, {}, set()
+
+        def scan(name, node):
+            if isinstance(node, Print) or (isinstance(node, Assign) and not isinstance(node.left, Var)):
+                impure.add(name)
+            elif isinstance(node, Var):
+                reads[name].add(node.name)
+            elif isinstance(node, Call):
+                calls[name].add(node.name)
+            for c in node.children(): scan(name, c)
+
+        for name, (params, body) in self.proc_env.items():
+            reads[name], calls[name] = set(), set()
+            scan(name, body)
+            # A parameter of a procedure is set by its callers.
+            reads[name].difference_update(params)
+        pure = set(name for name in self.proc_env if name not in impure)
+        changed = True
+        while changed:
+            changed = False
+            for name in list(pure):
+                if not calls[name] <= pure:
+                    pure.discard(name)
+                    changed = True
+        pure_procs = {}
+        for name in pure:
+            names, todo, seen = set(), [name], set([name])
+            while todo:
+                proc = todo.pop()
+                names.update(reads[proc])
+                for callee in calls[proc] - seen:
+                    seen.add(callee)
+                    todo.append(callee)
+            params = self.proc_env[name][0]
+            pure_procs[name] = tuple(params) + tuple(sorted(names - set(params)))
+        return pure_procs
+
+    def load(self, code):
+        """Parse and analyze a program, returning a Program."""
+        node = self.analyze(self.parse(code))
+        return Program(node, self.proc_env, self.pure_procs)
+
+    def execute(self, node):
+        """Execute the program with fresh global variables, raising EvalError."""
+        # local_var_env: map from local variable names to their values
+        # is_global: whether the current scope is global
+        self.reset()
+        local_var_env, is_global = {}, True
+        node.exec(self, local_var_env, is_global)
+
+    def reset(self):
+        """Start a run with fresh global variables and resource counters."""
+        self.global_var_env = {}
+        self.loops = {}
+        self.memos = {}
+        self.memo_hits = self.memo_misses = 0
+        self.views = {}
+        self.prune_at = 64
+        self.steps_left = sys.maxsize if self.max_steps is None else self.max_steps
+        self.allocated = 0
+        self.ticks = self.slice_steps
+
+    def call_pure(self, body, names, local_var_env):
+        """Execute the body of a pure procedure, or replay a remembered call
+        with the same values of the variables in names.
+        """
+        global_var_env = self.global_var_env
+        key = tuple(local_var_env[n] if n in local_var_env else global_var_env.get(n, UNDEFINED)
+                    for n in names)
+        memo = self.memos.get(body)
+        if memo is None:
+            memo = self.memos[body] = collections.OrderedDict()
+        try:
+            call = memo.get(key)
+        except TypeError:
+            # Arrays are not hashable, and may be changed by later calls.
+            body.exec(self, local_var_env, False)
+            return
+        if call is not None:
+            steps, allocated, failed = call
+            # A call that would exceed a limit is run, to stop where it would.
+            if steps <= self.steps_left and (self.max_alloc is None or self.allocated + allocated <= self.max_alloc):
+                self.memo_hits += 1
+                memo.move_to_end(key)
+                self.steps_left -= steps
+                self.allocated += allocated
+                if failed: raise EvalError()
+                return
+        self.memo_misses += 1
+        steps, allocated = self.steps_left, self.allocated
+        # Calls stopped by a limit, or by a Python error, are not remembered.
+        try:
+            body.exec(self, local_var_env, False)
+        except EvalError:
+            self.remember(memo, key, steps - self.steps_left, self.allocated - allocated, True)
+            raise
+        self.remember(memo, key, steps - self.steps_left, self.allocated - allocated, False)
+
+    def remember(self, memo, key, steps, allocated, failed):
+        memo[key] = (steps, allocated, failed)
+        if len(memo) > self.memo_size: memo.popitem(last=False)
+
+    def tier_up(self, loop, local_var_env, is_global):
+        """Return the CompiledLoop of a hot loop, or None if it cannot be compiled."""
+        compiled = CompiledLoop(loop)
+        try:
+            f = LoopCompiler(loop, local_var_env, self.global_var_env, is_global).function()
+            if f is not None: compiled.versions.append(f)
+        except CannotCompile:
+            compiled = None
+        self.loops[loop] = compiled
+        return compiled
+
+    def share(self, items, view):
+        """Record that view shares the list items."""
+        views = self.views.get(id(items))
+        if views is None:
+            # A list is freed with its last view, and its id may be reused.
+            if len(self.views) >= self.prune_at:
+                self.views = dict((k, s) for k, s in self.views.items() if s)
+                self.prune_at = max(64, 2 * len(self.views))
+            views = self.views[id(items)] = weakref.WeakValueDictionary()
+        views[id(view)] = view
+
+    def store(self, array, index, value):
+        """Store value at index of array, a list or an ArrayView, after the
+        views sharing its list copy their elements.
+        """
+        if isinstance(array, ArrayView):
+            array.own(self)
+            array, index = array.items, offset(index, len(array))
+        views = self.views.pop(id(array), None)
+        if views:
+            for view in list(views.values()): view.own(self)
+        array[index] = value
+
+    def alloc(self, size):
+        """Charge size more bytes of arrays or strings to the allocation budget.
+
+        Bytes are never given back, even when the values are dropped: the
+        budget bounds what a run allocates in all, and so what it may hold.
+        """
+        self.allocated += size
+        if self.max_alloc is not None and self.allocated > self.max_alloc:
+            raise LimitError('Allocation')
+
+    def stats(self):
+        """Return the resource usage of the last run."""
+        steps = sys.maxsize if self.max_steps is None else self.max_steps
+        return {'steps': steps - self.steps_left, 'allocated': self.allocated,
+                'memo_hits': self.memo_hits, 'memo_misses': self.memo_misses}
+
+    def run(self, code):
+        """Parse, analyze and execute a program.
+
+        Return (output, error) where output is the list of printed lines and
+        error is None, 'Parsing Error', 'Evaluation Error' or, when a
+        resource limit is exceeded, '<kind> Limit Exceeded'.
+        """
+        output, write = [], self.write
+        self.write = output.append
+        try:
+            self.run_program(self.load(code))
+        except tpg.Error:
+            return output, 'Parsing Error'
+        except EvalError:
+            return output, 'Evaluation Error'
+        except LimitError as e:
+            return output, '%s Limit Exceeded' % e.kind
+        finally:
+            self.write = write
+        return output, None
+
+    def run_program(self, program):
+        """Execute an already loaded Program."""
+        self.proc_env = program.proc_env
+        self.pure_procs = program.pure_procs
+        self.execute(program.node)
+
+    async def run_program_async(self, program, timeout=None):
+        """Execute an already loaded Program as a coroutine.
+
+        The program yields to the event loop every slice_steps steps, and
+        raises LimitError('Time') at the first yield after timeout seconds.
+        """
+        self.proc_env = program.proc_env
+        self.pure_procs = program.pure_procs
+        self.reset()
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        await program.node.aexec(self, {}, True)
+
+    async def pause(self):
+        """Yield to the event loop, checking the deadline first."""
+        import asyncio
+        self.ticks = self.slice_steps
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise LimitError('Time')
+        await asyncio.sleep(0)
+
 
 # Below is the driver code, which parses a given MustScript program,
 # collects procedure definitions in the program, and executes the program.
 
-# Open the input file, and read in the input program.
-prog = open(sys.argv[1]).read()
+if __name__ == '__main__':
+
+    # Open the input file, and read in the input program.
+    prog = open(sys.argv[1]).read()
+    interp = Interpreter(short_circuit='--eager-logic' not in sys.argv[2:],
+                         jit_threshold=None if '--no-jit' in sys.argv[2:] else 100)
+
+    try:
 
-try:
+        # Try to parse the program.
+        print('Parsing...')
+        node = interp.parse(prog)
 
-    # Try to parse the program.
-    print('Parsing...')
-    node = parse(prog)
+        # Try to collect procedure definitions in the program.
+        print('Collecting...')
+        node = interp.analyze(node)
 
-    # Try to collect procedure definitions in the program.
-    print('Collecting...')
-    # proc_env: map from procedure names to their parameters and body
-    proc_env = {}
-    node.anlz_procs()
+        # Try to execute the program.
+        print('Executing...')
+        interp.execute(node)
 
-    # Try to execute the program.
-    print('Executing...')
-    # global_var_env: map from global variable names to their values
-    # local_var_env: map from local variable names to their values
-    # is_global: whether the current scope is global
-    #pdb.set_trace()
-    global_var_env, local_var_env, is_global = {}, {}, True
-    node.exec(local_var_env, is_global)
+    # If an exception is rasied, print the appropriate error.
+    except tpg.Error:
+        print('Parsing Error')
 
-# If an exception is rasied, print the appropriate error.
-except tpg.Error:
-    print('Parsing Error')
+        # Uncomment the next line to re-raise the parsing error,
+        # displaying where the error occurs.  Comment it for submission.
 
-    # Uncomment the next line to re-raise the parsing error,
-    # displaying where the error occurs.  Comment it for submission.
+        # raise
 
-    # raise
+    except EvalError:
+        print('Evaluation Error')
 
-except EvalError:
-    print('Evaluation Error')
+        # Uncomment the next line to re-raise the evaluation error, 
+        # displaying where the error occurs.  Comment it for submission.
 
-    # Uncomment the next line to re-raise the evaluation error, 
-    # displaying where the error occurs.  Comment it for submission.
+        # raise
 
-    # raise
+    except LimitError as e:
+        print('%s Limit Exceeded' % e.kind)
@@ -0,0 +1,177 @@
+"""Execution profiler for MustScript programs.
+
+    python a4profile.py prog.txt [--top N] [--collapsed out.folded]
+
+Runs the program on a profiled copy of its AST, then prints a hot-spot
+report: the statements and procedures where the program spent its time,
+with execution counts.  --collapsed writes the time per call stack in the
+collapsed format read by flamegraph.pl and speedscope, in microseconds.
+"""
+
+import argparse
+import copy
+import sys
+import time
+
+import tpg
+from a4main import (Node, Program, Interpreter, EvalError, LimitError,
+                    Print, Assign, Block, If, While, Def, Call)
+
+STATEMENTS = (Print, Assign, Block, If, While, Def, Call)
+
+class StmtStats(object):
+    """Executions and time spent in one statement."""
+
+    def __init__(self, stmt):
+        self.stmt = stmt
+        self.count = 0
+        self.self_time = self.total_time = 0.0
+        self.active = 0
+
+    def label(self):
+        return '%s:%s %s' % (self.stmt.line, self.stmt.column, self.stmt.label)
+
+class ProcStats(object):
+    """Calls of and time spent in one procedure."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.self_time = self.total_time = 0.0
+        self.active = 0
+
+class Profiled(Node):
+    """Class of nodes timing the statement they wrap."""
+    fields = ['stmt', 'stats', 'profiler']
+
+    def anlz_procs(self, proc_env): self.stmt.anlz_procs(proc_env)
+
+    def exec(self, interp, local_var_env, is_global):
+        prof, stats = self.profiler, self.stats
+        prof.child_times.append(0.0)
+        stats.active += 1
+        start = time.perf_counter()
+        try:
+            self.stmt.exec(interp, local_var_env, is_global)
+        finally:
+            total = time.perf_counter() - start
+            own = total - prof.child_times.pop()
+            prof.child_times[-1] += total
+            stats.active -= 1
+            stats.count += 1
+            stats.self_time += own
+            if not stats.active:
+                # Only the outermost execution counts, so recursion is not counted twice.
+                stats.total_time += total
+            prof.procs[prof.stack[-1]].self_time += own
+            key = ';'.join(prof.stack) + ';' + stats.label()
+            prof.collapsed[key] = prof.collapsed.get(key, 0.0) + own
+
+class ProfiledProc(Node):
+    """Class of nodes wrapping the body of a procedure, tracking the call stack."""
+    fields = ['name', 'body', 'profiler']
+
+    def anlz_procs(self, proc_env): self.body.anlz_procs(proc_env)
+
+    def exec(self, interp, local_var_env, is_global):
+        prof = self.profiler
+        stats = prof.procs[self.name]
+        stats.count += 1
+        stats.active += 1
+        prof.stack.append(self.name)
+        start = time.perf_counter()
+        try:
+            self.body.exec(interp, local_var_env, is_global)
+        finally:
+            prof.stack.pop()
+            stats.active -= 1
+            if not stats.active:
+                # Only the outermost activation counts, so recursion is not counted twice.
+                stats.total_time += time.perf_counter() - start
+
+class Profiler(object):
+    """Profile executions of a Program.
+
+    Statements are wrapped in Profiled nodes, and procedure bodies in
+    ProfiledProc nodes, on a private copy of the program, so the original
+    program (which may be cached and shared) is never slowed down.
+    """
+
+    MAIN = '<main>'
+
+    def __init__(self, program):
+        self.stmts = []
+        self.procs = {self.MAIN: ProcStats(self.MAIN)}
+        self.collapsed = {}
+        self.stack = [self.MAIN]
+        self.child_times = [0.0]
+        node = self.instrument(copy.deepcopy(program.node))
+        proc_env = {}
+        node.anlz_procs(proc_env)
+        self.program = Program(node, proc_env)
+
+    def instrument(self, node):
+        """Return node with its statements wrapped in profiling nodes."""
+        for f in node.fields:
+            v = getattr(node, f)
+            if isinstance(v, Node):
+                setattr(node, f, self.instrument(v))
+            elif isinstance(v, list):
+                setattr(node, f, [self.instrument(c) if isinstance(c, Node) else c for c in v])
+        if isinstance(node, Def):
+            self.procs[node.name] = ProcStats(node.name)
+            node.body = ProfiledProc(node.name, node.body, self)
+        if isinstance(node, STATEMENTS) and not isinstance(node, (Block, Def)):
+            stats = StmtStats(node)
+            self.stmts.append(stats)
+            node = Profiled(node, stats, self)
+            node.line, node.column = stats.stmt.line, stats.stmt.column
+        return node
+
+    def run(self, interp):
+        """Execute the profiled program with interp."""
+        self.procs[self.MAIN].count += 1
+        start = time.perf_counter()
+        try:
+            interp.run_program(self.program)
+        finally:
+            self.procs[self.MAIN].total_time += time.perf_counter() - start
+
+    def report(self, top=20, out=sys.stdout):
+        """Write the hot statements and procedures, by decreasing self time."""
+        out.write('%-28s %10s %12s %12s\n' % ('statement', 'count', 'self ms', 'total ms'))
+        for s in sorted(self.stmts, key=lambda s: s.self_time, reverse=True)[:top]:
+            out.write('%-28s %10d %12.3f %12.3f\n' % (s.label(), s.count, s.self_time * 1e3, s.total_time * 1e3))
+        out.write('\n%-28s %10s %12s %12s\n' % ('procedure', 'calls', 'self ms', 'total ms'))
+        for p in sorted(self.procs.values(), key=lambda p: p.self_time, reverse=True)[:top]:
+            out.write('%-28s %10d %12.3f %12.3f\n' % (p.name, p.count, p.self_time * 1e3, p.total_time * 1e3))
+
+    def write_collapsed(self, out):
+        """Write the self time of each call stack, in microseconds."""
+        for key, seconds in sorted(self.collapsed.items()):
+            out.write('%s %d\n' % (key.replace(' ', '_'), round(seconds * 1e6)))
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='Profile a MustScript program')
+    args.add_argument('file')
+    args.add_argument('--top', type=int, default=20, help='number of entries in the report')
+    args.add_argument('--collapsed', metavar='FILE', help='write collapsed stacks for flamegraphs')
+    args = args.parse_args()
+    interp = Interpreter()
+    try:
+        profiler = Profiler(interp.load(open(args.file).read()))
+    except tpg.Error:
+        sys.exit('Parsing Error')
+    except EvalError:
+        sys.exit('Evaluation Error')
+    try:
+        profiler.run(interp)
+    except EvalError:
+        print('Evaluation Error')
+    except LimitError as e:
+        print('%s Limit Exceeded' % e.kind)
+    print('')
+    profiler.report(args.top)
+    if args.collapsed:
+        with open(args.collapsed, 'w') as out:
+            profiler.write_collapsed(out)
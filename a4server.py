@@ -0,0 +1,275 @@
+"""Long-running MustScript evaluation server.
+
+The server keeps one warm Interpreter (and so one generated Parser) for its
+whole life and caches loaded programs by the hash of their source, so a
+program submitted again skips parsing and procedure collection.  With
+--cache-dir, loaded programs are also kept on disk across restarts.
+
+Requests and responses are JSON objects, one per line:
+
+    {"id": 1, "source": "print 1+2;", "timeout": 0.5}
+    {"id": 1, "output": ["3"], "error": null, "cached": false}
+
+"error" is null, "Bad Request", "Parsing Error", "Evaluation Error" or
+"<kind> Limit Exceeded".  "source" must be a string and "timeout" a
+positive number of seconds, or null or absent for the default.  The protocol is spoken on stdin/stdout by default, or on a
+Unix socket with --socket PATH.
+
+With --async, programs run concurrently as asyncio tasks that yield every
+--slice-steps steps, and each printed line is streamed as soon as it is
+produced:
+
+    {"id": 1, "line": "3"}
+    {"id": 1, "output": null, "error": null, "cached": false, "done": true}
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+
+import a4main
+from a4cache import ProgramCache
+
+def check_request(request):
+    """Return None if request is a valid request object, else the error."""
+    if not isinstance(request, dict):
+        return 'Bad Request'
+    if not isinstance(request.get('source', ''), str):
+        return 'Bad Request'
+    timeout = request.get('timeout')
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                or not timeout > 0):
+        return 'Bad Request'
+    return None
+
+class Server(object):
+    """Evaluate MustScript programs with a warm interpreter.
+
+    cache_size: number of loaded programs kept in memory.
+    cache_dir: directory where loaded programs are kept, None for none.
+    timeout: default wall clock limit of a request, in seconds.
+    max_output: maximum number of lines printed by a request.
+    max_depth: Python recursion limit while a request runs.
+    max_steps: step budget of a request, None for no limit.
+    max_alloc: allocation budget of a request, the approximate bytes of
+               arrays and strings it may allocate in all, None for no limit.
+    short_circuit: False to evaluate both operands of "and" and "or".
+    """
+
+    def __init__(self, cache_size=256, timeout=5.0, max_output=10000, max_depth=5000,
+                 max_steps=None, max_alloc=None, cache_dir=None, short_circuit=True):
+        self.interp = a4main.Interpreter(max_steps=max_steps, max_alloc=max_alloc,
+                                         short_circuit=short_circuit)
+        self.cache = ProgramCache(cache_size, cache_dir)
+        self.timeout = timeout
+        self.max_output = max_output
+        self.max_depth = max_depth
+        self.max_steps = max_steps
+        self.max_alloc = max_alloc
+
+    def load(self, source):
+        """Return (program or error message, whether it came from the cache)."""
+        try:
+            return self.cache.load(self.interp, source)
+        except RecursionError:
+            # Too deeply nested to parse; not cached, the limit may change.
+            return 'Recursion Limit Exceeded', False
+
+    def handle(self, request):
+        """Evaluate one request and return the response object."""
+        error = check_request(request)
+        if error is not None:
+            rid = request.get('id') if isinstance(request, dict) else None
+            return {'id': rid, 'output': [], 'error': error}
+        output = []
+        response = {'id': request.get('id'), 'output': output, 'error': None}
+        program, response['cached'] = self.load(request.get('source', ''))
+        if isinstance(program, str):
+            response['error'] = program
+            return response
+
+        def write(text):
+            if len(output) >= self.max_output:
+                raise a4main.LimitError('Output')
+            output.append(text)
+
+        self.interp.write = write
+        depth = sys.getrecursionlimit()
+        sys.setrecursionlimit(self.max_depth)
+        try:
+            # The timer is stopped within the handlers, so an alarm going off
+            # as the program ends is still answered as a time limit.
+            try:
+                self.start_timer(request.get('timeout') or self.timeout)
+                self.interp.run_program(program)
+            finally:
+                self.stop_timer()
+        except a4main.EvalError:
+            response['error'] = 'Evaluation Error'
+        except a4main.LimitError as e:
+            response['error'] = '%s Limit Exceeded' % e.kind
+        except RecursionError:
+            response['error'] = 'Recursion Limit Exceeded'
+        except Exception:
+            # Python errors of programs the interpreter does not check, such
+            # as indexing an int, and MemoryError, must not stop the server.
+            response['error'] = 'Evaluation Error'
+        finally:
+            sys.setrecursionlimit(depth)
+            self.interp.global_var_env = {}
+        return response
+
+    def handle_line(self, line):
+        """Evaluate one JSON request line and return the JSON response line."""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return json.dumps({'id': None, 'output': [], 'error': 'Bad Request'})
+        return json.dumps(self.handle(request))
+
+    # Time limits use SIGALRM, which is only available on Unix and in the
+    # main thread; elsewhere requests run without a time limit.  An alarm
+    # delivered once the timer is stopped is ignored.
+
+    timing = False
+
+    def start_timer(self, seconds):
+        if seconds and hasattr(signal, 'setitimer'):
+            def alarm(signum, frame):
+                if self.timing:
+                    raise a4main.LimitError('Time')
+            signal.signal(signal.SIGALRM, alarm)
+            self.timing = True
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+
+    def stop_timer(self):
+        self.timing = False
+        if hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+class AsyncServer(Server):
+    """Evaluate MustScript programs concurrently on one event loop.
+
+    Every request gets its own interpreter, sharing the program cache, and
+    runs as a task that yields to the event loop every slice_steps steps.
+    Time limits are checked at those yields, so no signal or thread is used.
+    """
+
+    def __init__(self, cache_size=256, timeout=5.0, max_output=10000, slice_steps=1000,
+                 max_steps=None, max_alloc=None, cache_dir=None, short_circuit=True):
+        Server.__init__(self, cache_size, timeout, max_output, max_steps=max_steps,
+                        max_alloc=max_alloc, cache_dir=cache_dir, short_circuit=short_circuit)
+        self.slice_steps = slice_steps
+
+    async def handle_async(self, request, send):
+        """Evaluate one request, calling send with every response object."""
+        error = check_request(request)
+        if error is not None:
+            rid = request.get('id') if isinstance(request, dict) else None
+            send({'id': rid, 'output': None, 'error': error, 'done': True})
+            return
+        rid = request.get('id')
+        response = {'id': rid, 'output': None, 'error': None, 'done': True}
+        program, response['cached'] = self.load(request.get('source', ''))
+        if isinstance(program, str):
+            response['error'] = program
+            send(response)
+            return
+        lines = [0]
+
+        def write(text):
+            if lines[0] >= self.max_output:
+                raise a4main.LimitError('Output')
+            lines[0] += 1
+            send({'id': rid, 'line': text})
+
+        interp = a4main.Interpreter(write, self.slice_steps, self.max_steps, self.max_alloc)
+        try:
+            await interp.run_program_async(program, request.get('timeout') or self.timeout)
+        except a4main.EvalError:
+            response['error'] = 'Evaluation Error'
+        except a4main.LimitError as e:
+            response['error'] = '%s Limit Exceeded' % e.kind
+        except RecursionError:
+            response['error'] = 'Recursion Limit Exceeded'
+        except Exception:
+            # As in handle: the task must still answer with "done".
+            response['error'] = 'Evaluation Error'
+        send(response)
+
+async def serve_stdio_async(server, stdin=sys.stdin, stdout=sys.stdout):
+    """Answer requests read from stdin on stdout, running them concurrently."""
+    loop = asyncio.get_event_loop()
+    tasks = set()
+
+    def send(response):
+        stdout.write(json.dumps(response) + '\n')
+        stdout.flush()
+
+    while True:
+        line = await loop.run_in_executor(None, stdin.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            send({'id': None, 'output': None, 'error': 'Bad Request', 'done': True})
+            continue
+        task = asyncio.ensure_future(server.handle_async(request, send))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+
+def serve_stdio(server, stdin=sys.stdin, stdout=sys.stdout):
+    """Answer requests read from stdin on stdout until end of file."""
+    for line in stdin:
+        if line.strip():
+            stdout.write(server.handle_line(line) + '\n')
+            stdout.flush()
+
+def serve_unix(server, path):
+    """Answer requests on a Unix socket, one connection at a time."""
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    response = server.handle_line(line.decode('utf-8'))
+                    self.wfile.write((response + '\n').encode('utf-8'))
+
+    with socketserver.UnixStreamServer(path, Handler) as unix_server:
+        unix_server.serve_forever()
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument('--socket', help='serve on this Unix socket instead of stdin/stdout')
+    args.add_argument('--cache-size', type=int, default=256)
+    args.add_argument('--cache-dir', help='keep loaded programs in this directory')
+    args.add_argument('--timeout', type=float, default=5.0)
+    args.add_argument('--max-output', type=int, default=10000)
+    args.add_argument('--max-depth', type=int, default=5000)
+    args.add_argument('--async', dest='use_async', action='store_true',
+                      help='run programs concurrently on an asyncio event loop')
+    args.add_argument('--slice-steps', type=int, default=1000)
+    args.add_argument('--max-steps', type=int, help='step budget of a request')
+    args.add_argument('--max-alloc', type=int, help='allocation budget of a request, in bytes of arrays and strings')
+    args.add_argument('--eager-logic', action='store_true',
+                      help='evaluate both operands of "and" and "or"')
+    args = args.parse_args()
+    if args.use_async:
+        server = AsyncServer(args.cache_size, args.timeout, args.max_output, args.slice_steps,
+                             args.max_steps, args.max_alloc, args.cache_dir, not args.eager_logic)
+        asyncio.run(serve_stdio_async(server))
+        sys.exit()
+    server = Server(args.cache_size, args.timeout, args.max_output, args.max_depth,
+                    args.max_steps, args.max_alloc, args.cache_dir, not args.eager_logic)
+    if args.socket:
+        serve_unix(server, args.socket)
+    else:
+        serve_stdio(server)
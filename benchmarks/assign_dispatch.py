@@ -0,0 +1,80 @@
+"""Assignments specialized on their target and scope.
+
+    python benchmarks/assign_dispatch.py [--repeat 5]
+
+Runs assignment-heavy programs in the tree interpreter, loops never being
+compiled, with the assignments specialized by Interpreter.analyze into
+local, global and indexed stores, and with generic Assign nodes testing the
+scope and the shape of their target every time they run.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+from workloads import gcd_table, queens
+
+class Generic(a4main.Interpreter):
+    def analyze(self, node):
+        specialize_stores = a4main.Assign.specialize_stores
+        a4main.Assign.specialize_stores = lambda self, is_global: self
+        try:
+            return a4main.Interpreter.analyze(self, node)
+        finally:
+            a4main.Assign.specialize_stores = specialize_stores
+
+def stores(n):
+    """Global and local variable and array stores."""
+    return '''{
+    n = %d;
+    a = [0, 0, 0, 0];
+    i = 0;
+    while (i < n) {
+        a[i / (n / 4 + 1)] = i;
+        t = i + 1;
+        i = t;
+    }
+    def fill(m) {
+        b = [0, 0, 0, 0];
+        j = 0;
+        while (j < m) {
+            b[j / (m / 4 + 1)] = j;
+            a[0] = j;
+            u = j + 1;
+            j = u;
+        }
+    }
+    fill(n);
+    print a;
+}
+''' % n
+
+PROGRAMS = [('queens 7', queens(7)), ('gcd_table 500', gcd_table(500)), ('stores', stores(100000))]
+
+def run(cls, source, repeat):
+    interp = cls(write=lambda text: None, jit_threshold=None, memo_size=0)
+    best = None
+    for _ in range(repeat):
+        node = interp.parse(source)
+        node = interp.analyze(node)
+        start = time.perf_counter()
+        interp.execute(node)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='assignment specialization benchmark')
+    args.add_argument('--repeat', type=int, default=5, help='runs per program, the best is kept')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    print('%-14s %10s %13s %8s' % ('program', 'generic s', 'specialized s', 'speedup'))
+    for name, source in PROGRAMS:
+        generic = run(Generic, source, args.repeat)
+        specialized = run(a4main.Interpreter, source, args.repeat)
+        print('%-14s %10.4f %13.4f %7.2fx' % (name, generic, specialized, generic / specialized))
@@ -0,0 +1,52 @@
+"""Loading parsed MustScript programs from the binary AST format of a4ast.
+
+    python benchmarks/ast_format.py [--repeat 3]
+
+For each source, reports its size and the time to parse it, and the size
+and load time of its tree written by pickle and by a4ast.
+"""
+
+import argparse
+import glob
+import os
+import pickle
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4ast
+import a4main
+from workloads import big_source, gcd_table
+
+def best(function, argument, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='AST format benchmark')
+    args.add_argument('--repeat', type=int, default=3, help='runs of each measure, the best is kept')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    sources = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'a4input*.txt'))):
+        with open(path) as f:
+            sources.append((os.path.basename(path), f.read()))
+    sources += [('gcd_table 1000', gcd_table(1000)), ('big_source 100', big_source(100)),
+                ('big_source 1000', big_source(1000))]
+    print('%-16s %8s %9s %9s %9s %10s %10s %8s' % ('source', 'chars', 'parse s', 'pickle B', 'a4ast B',
+                                                   'unpickle s', 'a4ast s', 'vs parse'))
+    for name, source in sources:
+        tree = a4main.parse(source)
+        pickled = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        binary = a4ast.dumps(tree)
+        parse = best(a4main.parse, source, args.repeat)
+        unpickle = best(pickle.loads, pickled, args.repeat)
+        load = best(a4ast.loads, binary, args.repeat)
+        print('%-16s %8d %9.4f %9d %9d %10.4f %10.4f %7.1fx' % (name, len(source), parse, len(pickled),
+                                                               len(binary), unpickle, load, parse / load))
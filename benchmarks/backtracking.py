@@ -0,0 +1,103 @@
+"""Context sensitive lexing of an ambiguous grammar.
+
+    python benchmarks/backtracking.py [--depth 6] [--repeat 3]
+
+Parses nested expressions whose alternatives share long prefixes, so the
+parser backtracks over the same tokens many times.  ContextSensitiveLexer
+matches each token at most once at each position; "rematch" is the same
+lexer running the regular expressions again at every attempt, as it did
+before.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+
+class Ambiguous(tpg.Parser):
+    r"""
+    set lexer = ContextSensitiveLexer
+
+    separator spaces:  '\s+' ;
+    separator comment: '\#.*' ;
+    token number:      '\d+' ;
+    token name:        '[a-z]\w*' ;
+
+    START/n -> Stmt/n ( Stmt/m $ n = n + m $ )* ;
+
+    Stmt/n -> Exp/n ';'
+            | Exp/n '!' ';'  $ n = n + 1 $
+            | Exp/n '\?' ';'  $ n = n + 2 $
+            ;
+
+    Exp/n -> Term/n '\+' Exp/m  $ n = n + m $
+           | Term/n '-' Exp/m  $ n = n + m $
+           | Term/n
+           ;
+
+    Term/n -> '\(' Exp/n '\)' '\*' Term/m  $ n = n + m $
+            | '\(' Exp/n '\)'
+            | number/n  $ n = 1 $
+            | name  $ n = 1 $
+            ;
+    """
+
+class Forgetful(dict):
+    def __setitem__(self, key, value):
+        pass
+
+class RematchingLexer(tpg.ContextSensitiveLexer):
+    def start(self, input):
+        tpg.ContextSensitiveLexer.start(self, input)
+        self.matches = Forgetful()
+        self.skips = Forgetful()
+        self.back(None)
+
+class Rematching(Ambiguous):
+    def init_lexer(self):
+        lexer = Ambiguous.init_lexer(self)
+        lexer.__class__ = RematchingLexer
+        return lexer
+
+def expression(depth, rnd):
+    if depth == 0:
+        return rnd.choice(['x', 'y1', '42', '7'])
+    if rnd.random() < 0.5:
+        return '(%s)' % expression(depth - 1, rnd)
+    return '%s %s %s' % (expression(depth - 1, rnd), rnd.choice('+-'), expression(depth - 1, rnd))
+
+def source(depth, statements, rnd):
+    lines = []
+    for i in range(statements):
+        lines.append('# statement %d' % i)
+        lines.append('%s %s;' % (expression(depth, rnd), rnd.choice(['', '!', '?'])))
+    return '\n'.join(lines) + '\n'
+
+def run(parser, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parser(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='context sensitive lexer backtracking benchmark')
+    args.add_argument('--depth', type=int, default=6, help='maximum nesting of the expressions')
+    args.add_argument('--repeat', type=int, default=3, help='runs per parser, the best is kept')
+    args = args.parse_args()
+    rnd = random.Random(0)
+    print('%6s %8s %12s %12s %8s' % ('depth', 'chars', 'rematch s', 'memo s', 'speedup'))
+    for depth in range(2, args.depth + 1):
+        text = source(depth, 20, rnd)
+        rematch, r1 = run(Rematching(), text, args.repeat)
+        memo, r2 = run(Ambiguous(), text, args.repeat)
+        assert r1 == r2
+        print('%6d %8d %12.4f %12.4f %7.2fx' % (depth, len(text), rematch, memo, rematch / memo))
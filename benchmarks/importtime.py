@@ -0,0 +1,54 @@
+"""Startup time of the interpreter.
+
+    python benchmarks/importtime.py [--repeat 5]
+
+Imports a4main in fresh processes under python -X importtime, first with an
+empty cache of generated parsers, when the MustScript grammar is parsed and
+checked by TPG, then with the cache written by the first import.  Reports the
+cumulative import times of tpg and a4main, in milliseconds, the best of
+--repeat processes.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_times(env):
+    """Return the cumulative import time of every module, in microseconds."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import a4main'],
+                            cwd=ROOT, env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+def best(env, repeat, clear=None):
+    results = []
+    for _ in range(repeat):
+        if clear is not None:
+            for name in os.listdir(clear):
+                os.remove(os.path.join(clear, name))
+        results.append(import_times(env))
+    return dict((name, min(r.get(name, 0) for r in results)) for name in ('tpg', 'a4main'))
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='import time benchmark')
+    args.add_argument('--repeat', type=int, default=5, help='processes per measure, the best is kept')
+    args = args.parse_args()
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, TPG_CACHE_DIR=cache)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in [ROOT, env.get('PYTHONPATH')] if p)
+        cold = best(env, args.repeat, clear=cache)
+        import_times(env)
+        warm = best(env, args.repeat)
+    print('%-8s %10s %10s' % ('module', 'cold ms', 'warm ms'))
+    for name in ('tpg', 'a4main'):
+        print('%-8s %10.1f %10.1f' % (name, cold[name] / 1000.0, warm[name] / 1000.0))
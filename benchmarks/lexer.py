@@ -0,0 +1,84 @@
+"""Throughput of tpg.Lexer as the number of tokens grows.
+
+    python benchmarks/lexer.py [--tokens 20000] [--repeat 3]
+
+Builds lexers with an increasing number of keywords, plus identifiers,
+integers and operators, and lexes the same number of tokens with each.
+Lexer only tries the tokens that can start with the current character;
+"scan all" is the same lexer trying every token at every position, as it
+did before.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+
+class ScanAll(tpg.Lexer):
+    def build(self):
+        self.dispatch = {}
+        self.non_ascii = tuple(self.tokens)
+
+def keywords(count, rnd):
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rnd.randint(3, 8))))
+    return sorted(words)
+
+def make_lexer(cls, words):
+    lexer = cls(True, re.MULTILINE)
+    for word in words:
+        lexer.def_token('kw_' + word, word)
+    lexer.def_token('ident', r'[a-zA-Z_]\w*')
+    lexer.def_token('int', r'\d+')
+    lexer.def_token('op', r'[-+*/=<>]=?|[(){};,]')
+    lexer.def_separator('spaces', r'\s+')
+    lexer.def_separator('comment', r'#.*')
+    return lexer
+
+def make_input(words, count, rnd):
+    tokens = []
+    for _ in range(count):
+        kind = rnd.random()
+        if kind < 0.4:
+            tokens.append(rnd.choice(words))
+        elif kind < 0.7:
+            tokens.append('v%d' % rnd.randint(0, 999))
+        elif kind < 0.85:
+            tokens.append(str(rnd.randint(0, 99999)))
+        else:
+            tokens.append(rnd.choice('+-*/=<>(){};,'))
+    return ' '.join(tokens)
+
+def lex(lexer, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lexer.start(text)
+        while not lexer.eof():
+            lexer.next_token()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='lexer throughput benchmark')
+    args.add_argument('--tokens', type=int, default=20000, help='tokens lexed per lexer')
+    args.add_argument('--repeat', type=int, default=3, help='runs per lexer, the best is kept')
+    args = args.parse_args()
+    rnd = random.Random(0)
+    print('%9s %14s %14s %8s' % ('keywords', 'scan all tok/s', 'Lexer tok/s', 'speedup'))
+    for count in [5, 20, 100, 400, 1000]:
+        words = keywords(count, rnd)
+        text = make_input(words, args.tokens, rnd)
+        scan_all = lex(make_lexer(ScanAll, words), text, args.repeat)
+        dispatch = lex(make_lexer(tpg.Lexer, words), text, args.repeat)
+        print('%9d %14.0f %14.0f %7.2fx' % (count, args.tokens / scan_all, args.tokens / dispatch,
+                                            scan_all / dispatch))
@@ -0,0 +1,67 @@
+"""Loop-invariant code motion.
+
+    python benchmarks/licm.py [--repeat 5]
+
+Runs loops reading globals and invariant subexpressions, with and without
+Interpreter.hoist_invariants, and reports their execution times.  The loops
+call a procedure, so they are never compiled, as hot loops without calls
+would be, and calls are not memoized.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+from workloads import queens
+
+class NoHoisting(a4main.Interpreter):
+    def hoist_invariants(self, node): return node
+
+def invariants(n):
+    """A procedure looping over globals and an invariant table lookup."""
+    return '''{
+    n = %d;
+    scale = 3;
+    table = [[1, 2, 3], [4, 5, 6]];
+    def put(v) { last = v; }
+    def run(row) {
+        i = 0;
+        while (i < n * scale) {
+            put(i * table[row][2] + (n - scale) / table[row][1]);
+            i = i + 1;
+        }
+    }
+    run(1);
+    print n;
+}
+''' % n
+
+PROGRAMS = [('queens 8', queens(8)), ('invariants', invariants(30000))]
+
+def run(cls, source, repeat):
+    interp = cls(write=lambda text: None, memo_size=0)
+    best = None
+    for _ in range(repeat):
+        node = interp.parse(source)
+        node = interp.analyze(node)
+        start = time.perf_counter()
+        interp.execute(node)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='loop-invariant code motion benchmark')
+    args.add_argument('--repeat', type=int, default=5, help='runs per program, the best is kept')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    print('%-12s %10s %10s %8s' % ('program', 'plain s', 'hoisted s', 'speedup'))
+    for name, source in PROGRAMS:
+        plain = run(NoHoisting, source, args.repeat)
+        hoisted = run(a4main.Interpreter, source, args.repeat)
+        print('%-12s %10.4f %10.4f %7.2fx' % (name, plain, hoisted, plain / hoisted))
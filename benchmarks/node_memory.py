@@ -0,0 +1,77 @@
+"""Memory and construction time of AST nodes.
+
+Parses a large generated program and reports the number of nodes, the
+bytes traced per node, and the time to build one node directly through
+the generated __init__, next to the same nodes built with a __dict__.
+
+    python benchmarks/node_memory.py [--size 1000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+from workloads import big_source
+
+class DictNode(object):
+    """A node holding the same attributes in a __dict__, for comparison."""
+
+    def __init__(self, fields, *args):
+        self.line = self.column = None
+        self.cost = 1
+        for f, a in zip(fields, args): setattr(self, f, a)
+
+def count(node):
+    return 1 + sum(count(c) for c in node.children())
+
+def copy_as_dicts(node):
+    args = []
+    for f in node.fields:
+        v = getattr(node, f)
+        if isinstance(v, a4main.Node): v = copy_as_dicts(v)
+        elif isinstance(v, list): v = [copy_as_dicts(c) if isinstance(c, a4main.Node) else c for c in v]
+        args.append(v)
+    return DictNode(node.fields, *args)
+
+def traced(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tree = build()
+        return tree, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+def per_call(n, make):
+    start = time.perf_counter()
+    for _ in range(n):
+        make()
+    return (time.perf_counter() - start) / n
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='AST node memory benchmark')
+    args.add_argument('--size', type=int, default=1000, help='size of the generated program')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+
+    parser = a4main.Parser()
+    source = big_source(args.size)
+    node = parser(source)
+    nodes = count(node)
+    _, slot_bytes = traced(lambda: parser(source))
+    _, dict_bytes = traced(lambda: copy_as_dicts(node))
+    print('nodes                 %10d' % nodes)
+    print('slots, whole parse    %10.1f bytes/node' % (slot_bytes / float(nodes)))
+    print('__dict__ copy of tree %10.1f bytes/node' % (dict_bytes / float(nodes)))
+
+    left, right = a4main.Var('a'), a4main.Int(1)
+    fields = a4main.BinOpExp.fields
+    n = 200000
+    print('BinOpExp(...)         %10.1f ns' % (per_call(n, lambda: a4main.BinOpExp(left, '+', right)) * 1e9))
+    print('generic setattr loop  %10.1f ns' % (per_call(n, lambda: DictNode(fields, left, '+', right)) * 1e9))
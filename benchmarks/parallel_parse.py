@@ -0,0 +1,51 @@
+"""Parallel parsing of many MustScript files with a4build.
+
+    python benchmarks/parallel_parse.py [--files 64] [--size 50]
+
+Writes a project of generated sources to a temporary directory and parses
+it with a4build.parse_files using 1, 2, 4, ... worker processes, up to the
+number of cores.  With one worker the files are parsed in this process.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4build
+from workloads import big_source, gcd_table, queens
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='parallel parsing benchmark')
+    args.add_argument('--files', type=int, default=64)
+    args.add_argument('--size', type=int, default=50, help='procedures of the largest files')
+    args = args.parse_args()
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.files):
+            source = [big_source(1 + i % args.size), gcd_table(10 + i), queens(4 + i % 8)][i % 3]
+            path = os.path.join(directory, 'file%d.txt' % i)
+            with open(path, 'w') as f:
+                f.write(source)
+            paths.append(path)
+        chars = sum(os.path.getsize(path) for path in paths)
+        print('%d files, %d chars, %d cores' % (len(paths), chars, cores))
+        print('%8s %10s %8s' % ('workers', 'seconds', 'speedup'))
+        base = None
+        for workers in counts:
+            start = time.perf_counter()
+            trees = a4build.parse_files(paths, workers)
+            elapsed = time.perf_counter() - start
+            assert not any(isinstance(tree, str) for tree in trees.values())
+            base = base or elapsed
+            print('%8d %10.3f %7.2fx' % (workers, elapsed, base / elapsed))
@@ -0,0 +1,61 @@
+"""Cost of making a MustScript parser for every program.
+
+    python benchmarks/parser_reuse.py [--count 2000]
+
+a4main.parse makes a new Parser for every program.  Parsers of a class share
+the lexer built once by init_lexer and only fork its state, where they used
+to define and compile every token again.  Times making parsers alone and
+making a parser to parse each of the a4input sources, with the default
+lexer and with ContextSensitiveLexer, sharing the lexer or not.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+from a4main import *
+
+class Unshared(Parser):
+    share_lexer = False
+
+class ContextSensitive(Parser):
+    __doc__ = 'set lexer = ContextSensitiveLexer\n' + Parser.__doc__
+
+class UnsharedContextSensitive(ContextSensitive):
+    share_lexer = False
+
+def run(cls, sources, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        cls()
+    make = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        for source in sources:
+            cls()(source)
+    parse = (time.perf_counter() - start) / count / len(sources)
+    return make, parse
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='parser construction benchmark')
+    args.add_argument('--count', type=int, default=2000, help='parsers made per measure')
+    args = args.parse_args()
+    sources = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'a4input*.txt'))):
+        with open(path) as f:
+            sources.append(f.read())
+    print('%-18s %12s %12s %14s %14s %8s' % ('lexer', 'make us', 'shared us', 'make+parse us',
+                                             'shared us', 'speedup'))
+    for name, unshared, shared in [('NamedGroupLexer', Unshared, Parser),
+                                   ('ContextSensitive', UnsharedContextSensitive, ContextSensitive)]:
+        make, parse = run(unshared, sources, args.count)
+        shared_make, shared_parse = run(shared, sources, args.count)
+        print('%-18s %12.1f %12.1f %14.1f %14.1f %7.2fx' % (name, make * 1e6, shared_make * 1e6,
+                                                             parse * 1e6, shared_parse * 1e6,
+                                                             parse / shared_parse))
@@ -0,0 +1,111 @@
+"""Benchmark suite for the MustScript interpreter and the TPG parser.
+
+    python benchmarks/run.py [--full] [--only NAME] [--save out.json] [--compare old.json]
+
+For every workload and size, reports the time spent parsing, collecting
+procedures (analyze) and executing, plus the peak memory traced by
+tracemalloc during a separate run.  --save writes the results as JSON and
+--compare prints the time ratios against results saved earlier.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+from workloads import WORKLOADS
+
+PHASES = ['parse', 'analyze', 'exec']
+
+def run_once(source, execute):
+    """Return the time of each phase of one run of source."""
+    interp = a4main.Interpreter(write=lambda text: None)
+    times = {}
+    start = time.perf_counter()
+    node = interp.parse(source)
+    times['parse'] = time.perf_counter() - start
+    start = time.perf_counter()
+    node = interp.analyze(node)
+    times['analyze'] = time.perf_counter() - start
+    start = time.perf_counter()
+    if execute:
+        interp.execute(node)
+    times['exec'] = time.perf_counter() - start
+    return times
+
+def peak_memory(source, execute):
+    """Return the peak traced memory, in bytes, of one run of source."""
+    tracemalloc.start()
+    try:
+        run_once(source, execute)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench(name, generator, size, execute, repeat, memory):
+    source = generator(size)
+    runs = [run_once(source, execute) for _ in range(repeat)]
+    result = {'workload': name, 'size': size, 'source_bytes': len(source)}
+    for phase in PHASES:
+        result[phase] = min(r[phase] for r in runs)
+    result['peak_bytes'] = peak_memory(source, execute) if memory else None
+    return result
+
+def metadata():
+    try:
+        rev = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                      stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        rev = None
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'revision': rev, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def print_result(r, old=None):
+    line = '%-11s %8d' % (r['workload'], r['size'])
+    for phase in PHASES:
+        line += ' %10.4f' % r[phase]
+    line += ' %10s' % ('-' if r['peak_bytes'] is None else '%d' % (r['peak_bytes'] // 1024))
+    if old is not None:
+        line += '  ' + ' '.join('%6.2fx' % (r[p] / old[p] if old[p] else 1.0) for p in PHASES)
+    print(line)
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='MustScript benchmark suite')
+    args.add_argument('--full', action='store_true', help='run the largest sizes too')
+    args.add_argument('--only', action='append', metavar='NAME', help='run only this workload')
+    args.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best is kept')
+    args.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    args.add_argument('--save', metavar='FILE', help='write the results as JSON')
+    args.add_argument('--compare', metavar='FILE', help='JSON results to compare with')
+    args = args.parse_args()
+
+    sys.setrecursionlimit(100000)
+    old = {}
+    if args.compare:
+        with open(args.compare) as f:
+            for r in json.load(f)['results']:
+                old[r['workload'], r['size']] = r
+
+    header = '%-11s %8s %10s %10s %10s %10s' % ('workload', 'size', 'parse s', 'analyze s', 'exec s', 'peak KiB')
+    if old:
+        header += '  ' + ' '.join('%7s' % p for p in PHASES)
+    print(header)
+    results = []
+    for name, generator, sizes, full_sizes, execute in WORKLOADS:
+        if args.only and name not in args.only:
+            continue
+        for size in (full_sizes if args.full else sizes):
+            r = bench(name, generator, size, execute, args.repeat, not args.no_memory)
+            print_result(r, old.get((name, size)))
+            results.append(r)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'meta': metadata(), 'results': results}, f, indent=1)
@@ -0,0 +1,89 @@
+"""Separator skipping of tpg.ContextSensitiveLexer.
+
+    python benchmarks/separators.py [--repeat 3]
+
+Parses indented, commented MustScript sources with the MustScript grammar
+lexed by ContextSensitiveLexer, whose separators are skipped by a single
+regular expression, and with the same lexer matching one regular expression
+per separator until none matches, as it did before.
+
+The lexer skips the separators only once at each position of a parse, so
+the parses spend little of their time there and take about as long either
+way.  The skip columns time the skipping alone, from every position of the
+source.
+"""
+
+import argparse
+import gc
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+from a4main import *
+from workloads import big_source
+
+class ContextSensitive(Parser):
+    __doc__ = 'set lexer = ContextSensitiveLexer\n' + Parser.__doc__
+
+class PerSeparator(ContextSensitive):
+    def init_lexer(self):
+        lexer = ContextSensitive.init_lexer(self)
+        # False means the separators could not be combined.
+        lexer.build = lambda: setattr(lexer, 'separator_re', False)
+        return lexer
+
+def run_skips(parser, source, repeat):
+    """Return the best time of skipping the separators at every position."""
+    lexer = parser.shared_lexer().fork()
+    lexer.start(source)
+    best = None
+    for _ in range(repeat):
+        lexer.skips = {}
+        skip = lexer.skip
+        start = time.perf_counter()
+        for pos in range(len(source)):
+            skip(pos, 1, 1)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(parsers, source, repeat):
+    """Return the best time of parsing source with each parser.
+
+    The parsers take turns, from a collected heap, so a slower machine or a
+    heap grown by earlier parses slows them alike.
+    """
+    best = [None] * len(parsers)
+    for _ in range(repeat):
+        for i, parser in enumerate(parsers):
+            gc.collect()
+            start = time.perf_counter()
+            parser(source)
+            elapsed = time.perf_counter() - start
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='separator skipping benchmark')
+    args.add_argument('--repeat', type=int, default=3, help='parses per source, the best is kept')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    sources = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'a4input*.txt'))):
+        with open(path) as f:
+            sources.append((os.path.basename(path), f.read()))
+    sources += [('big_source 100', big_source(100)), ('big_source 1000', big_source(1000))]
+    print('%-16s %8s %12s %12s %8s %12s %12s %8s' % (
+        'source', 'chars', 'per sep. s', 'combined s', 'parse', 'per sep. s', 'combined s', 'skip'))
+    for name, source in sources:
+        per_separator, combined = run([PerSeparator(), ContextSensitive()], source, args.repeat)
+        skip_per_separator = run_skips(PerSeparator(), source, args.repeat)
+        skip_combined = run_skips(ContextSensitive(), source, args.repeat)
+        print('%-16s %8d %12.4f %12.4f %7.2fx %12.4f %12.4f %7.2fx' % (
+            name, len(source), per_separator, combined, per_separator / combined,
+            skip_per_separator, skip_combined, skip_per_separator / skip_combined))
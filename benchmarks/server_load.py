@@ -0,0 +1,65 @@
+"""Load generator for the MustScript evaluation server.
+
+Starts a4server.py on stdin/stdout, sends a mix of the sample programs and
+reports request latency percentiles.  For comparison, it also times
+spawning a4main.py once per program.
+
+    python benchmarks/server_load.py -n 2000
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+def report(name, samples):
+    print('%-10s n=%-6d p50=%8.3f ms  p99=%8.3f ms  mean=%8.3f ms' % (
+        name, len(samples), percentile(samples, 50) * 1e3,
+        percentile(samples, 99) * 1e3, sum(samples) / len(samples) * 1e3))
+
+def bench_server(sources, n):
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'a4server.py')],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              universal_newlines=True, bufsize=1)
+    latencies = []
+    try:
+        for i in range(n):
+            line = json.dumps({'id': i, 'source': sources[i % len(sources)]})
+            start = time.perf_counter()
+            server.stdin.write(line + '\n')
+            server.stdin.flush()
+            response = json.loads(server.stdout.readline())
+            latencies.append(time.perf_counter() - start)
+            assert response['id'] == i, response
+    finally:
+        server.stdin.close()
+        server.wait()
+    return latencies
+
+def bench_spawn(paths, n):
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        subprocess.check_output([sys.executable, os.path.join(ROOT, 'a4main.py'), paths[i % len(paths)]])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='MustScript server load generator')
+    args.add_argument('-n', type=int, default=1000, help='number of server requests')
+    args.add_argument('--spawn', type=int, default=20, help='number of a4main.py spawns')
+    args = args.parse_args()
+    paths = sorted(glob.glob(os.path.join(ROOT, 'a4input*.txt')))
+    sources = [open(path).read() for path in paths]
+    report('server', bench_server(sources, args.n))
+    if args.spawn:
+        report('spawn', bench_spawn(paths, args.spawn))
@@ -0,0 +1,60 @@
+"""Short-circuit against eager evaluation of "and" and "or".
+
+    python benchmarks/short_circuit.py [--repeat 3]
+
+Runs condition-heavy programs with both settings of
+Interpreter.short_circuit and reports their execution times.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+from workloads import queens
+
+def scan(n):
+    """A loop whose conditions are mostly decided by their left operand."""
+    return '''{
+    a = [%s];
+    found = 0;
+    i = 0;
+    while (i < %d) {
+        if (i > %d and a[i] == 1 and a[i - 1] == 1)
+            found = found + 1;
+        if (i < 10 or a[i] + a[i - 1] > 1)
+            found = found + 1;
+        i = i + 1;
+    }
+    print found;
+}
+''' % (','.join(['1'] * n), n, n - 10)
+
+PROGRAMS = [('queens 8', queens(8)), ('queens 9', queens(9)), ('scan 100000', scan(100000))]
+
+def run(source, short_circuit, repeat):
+    interp = a4main.Interpreter(write=lambda text: None, short_circuit=short_circuit)
+    best = None
+    for _ in range(repeat):
+        node = interp.parse(source)
+        node = interp.analyze(node)
+        start = time.perf_counter()
+        interp.execute(node)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='short-circuit logic benchmark')
+    args.add_argument('--repeat', type=int, default=3, help='runs per program, the best is kept')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    print('%-12s %10s %10s %8s' % ('program', 'eager s', 'short s', 'speedup'))
+    for name, source in PROGRAMS:
+        eager = run(source, False, args.repeat)
+        short = run(source, True, args.repeat)
+        print('%-12s %10.4f %10.4f %7.2fx' % (name, eager, short, eager / short))
@@ -0,0 +1,99 @@
+"""Array and string slicing.
+
+    python benchmarks/slicing.py [--repeat 3]
+
+Runs programs splitting large arrays and strings with a[i:j], once with
+slices as views sharing the storage of the sliced value and once with every
+slice copied, and reports their execution times and the bytes they charge
+to the allocation budget.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+
+def data(n):
+    return '[%s]' % ', '.join(str(7 * i % 1000) for i in range(n))
+
+def suffixes(n):
+    """Sum of an array, taking its first element off n times."""
+    return '''{
+    rest = %s;
+    n = %d;
+    sum = 0;
+    while (n > 0) {
+        sum = sum + rest[0];
+        rest = rest[1:];
+        n = n - 1;
+    }
+    print sum;
+}
+''' % (data(n), n)
+
+def halves(n):
+    """Sum of an array, split in halves down to single elements."""
+    return '''{
+    acc = [0];
+    def total(a, n) {
+        if (n == 1) acc[0] = acc[0] + a[0];
+        if (n > 1) {
+            m = n / 2;
+            total(a[:m], m);
+            total(a[m:], n - m);
+        }
+    }
+    total(%s, %d);
+    print acc[0];
+}
+''' % (data(n), n)
+
+def chars(n):
+    """A long string copied character by character, taking each off its tail."""
+    return '''{
+    s = "%s";
+    n = %d;
+    copy = "";
+    while (n > 0) {
+        copy = copy + s[0];
+        s = s[1:];
+        n = n - 1;
+    }
+    print copy[%d];
+}
+''' % ('abc' * (n // 3), n - n % 3, n - n % 3 - 1)
+
+PROGRAMS = [('suffixes', suffixes(20000)), ('halves', halves(20000)), ('chars', chars(100000))]
+
+def run(source, repeat):
+    interp = a4main.Interpreter(write=lambda text: None)
+    best = None
+    for _ in range(repeat):
+        node = interp.parse(source)
+        node = interp.analyze(node)
+        start = time.perf_counter()
+        interp.execute(node)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, interp.allocated
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='slicing benchmark')
+    args.add_argument('--repeat', type=int, default=3, help='runs per program, the best is kept')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    print('%-10s %10s %10s %8s %12s %12s' % ('program', 'copies s', 'views s', 'speedup', 'copies MB', 'views MB'))
+    view_min = a4main.VIEW_MIN
+    for name, source in PROGRAMS:
+        # Slices shorter than VIEW_MIN are copied.
+        a4main.VIEW_MIN = sys.maxsize
+        copies, copies_allocated = run(source, args.repeat)
+        a4main.VIEW_MIN = view_min
+        views, views_allocated = run(source, args.repeat)
+        print('%-10s %10.4f %10.4f %7.2fx %12.1f %12.1f' % (name, copies, views, copies / views,
+                                                          copies_allocated / 1e6, views_allocated / 1e6))
@@ -0,0 +1,97 @@
+"""Overhead of step and allocation accounting in the interpreter.
+
+Runs loop-heavy programs with and without limits and reports the time per
+step.  Steps and allocations are counted in both runs, since the counters
+are part of every node, so the two columns only show the cost of checking
+the limits.  The cost of the accounting itself is measured with --against
+REV, which also runs the programs with a4main.py and tpg.py from git
+revision REV, the revision before the accounting was added:
+
+    python benchmarks/step_budget.py --against <rev>
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+
+COUNT = '''{
+    i = 0; t = 0;
+    while (i < 200000) { t = t + i * 2; i = i + 1; }
+    print t;
+}'''
+
+GCD = '''{
+    i = 1; tot = 0;
+    while (i < 80) {
+        j = 1;
+        while (j < 80) {
+            a = i; b = j;
+            while (b > 0) { if (a > b) { a = a - b; } if (not (a > b)) { b = b - a; } }
+            tot = tot + a;
+            j = j + 1;
+        }
+        i = i + 1;
+    }
+    print tot;
+}'''
+
+QUEENS = open(os.path.join(ROOT, 'a4input4.txt')).read()
+
+WORKLOADS = [('count', COUNT), ('gcd', GCD), ('queens8', QUEENS)]
+
+def best_of(repeat, run):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench_in_process(repeat):
+    # Both interpreters count steps and allocations, only one has limits.
+    print('%-10s %12s %12s %12s %10s' % ('workload', 'steps', 'no limit', 'limited', 'ns/step'))
+    for name, source in WORKLOADS:
+        free = a4main.Interpreter(write=lambda text: None)
+        limited = a4main.Interpreter(write=lambda text: None, max_steps=10**12, max_alloc=10**12)
+        program = free.load(source)
+        t_free = best_of(repeat, lambda: free.run_program(program))
+        t_limited = best_of(repeat, lambda: limited.run_program(program))
+        steps = free.stats()['steps']
+        print('%-10s %12d %10.3f s %10.3f s %10.1f' % (name, steps, t_free, t_limited, t_free / steps * 1e9))
+
+def bench_against(rev, repeat):
+    base = tempfile.mkdtemp()
+    try:
+        for name in ('a4main.py', 'tpg.py'):
+            with open(os.path.join(base, name), 'wb') as f:
+                f.write(subprocess.check_output(['git', 'show', '%s:%s' % (rev, name)], cwd=ROOT))
+        print('%-10s %12s %12s %8s' % ('workload', rev[:12], 'current', 'ratio'))
+        for name, source in WORKLOADS:
+            path = os.path.join(base, name + '.txt')
+            with open(path, 'w') as f:
+                f.write(source)
+            def run(directory):
+                return lambda: subprocess.check_output([sys.executable, os.path.join(directory, 'a4main.py'), path])
+            t_base = best_of(repeat, run(base))
+            t_cur = best_of(repeat, run(ROOT))
+            print('%-10s %10.3f s %10.3f s %8.3f' % (name, t_base, t_cur, t_cur / t_base))
+    finally:
+        shutil.rmtree(base)
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='Step accounting overhead benchmark')
+    args.add_argument('--repeat', type=int, default=3)
+    args.add_argument('--against', metavar='REV', help='git revision to compare with')
+    args = args.parse_args()
+    bench_in_process(args.repeat)
+    if args.against:
+        bench_against(args.against, args.repeat)
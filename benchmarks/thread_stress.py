@@ -0,0 +1,97 @@
+"""Stress test of one MustScript parser shared by many threads.
+
+    python benchmarks/thread_stress.py [--threads 16] [--rounds 20]
+
+Every thread parses the a4input sources, generated sources and sources with
+syntax errors through the same Parser object, for each lexer, with a very
+short thread switch interval to interleave the parses as much as possible.
+Each parse runs in its own context (tpg.Parser.context), so every result
+must be the one of a parse made alone: the script exits with status 1 on
+the first difference and otherwise reports the parse throughput.
+"""
+
+import argparse
+import glob
+import os
+import pickle
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+from a4main import *
+from workloads import big_source, queens, gcd_table
+
+class ContextSensitive(Parser):
+    __doc__ = 'set lexer = ContextSensitiveLexer\n' + Parser.__doc__
+
+class Cached(Parser):
+    __doc__ = 'set lexer = CacheNamedGroupLexer\n' + Parser.__doc__
+
+def outcome(parser, source):
+    """Return the pickled tree of source, or its syntax error."""
+    try:
+        return pickle.dumps(parser(source))
+    except tpg.Error as e:
+        return str(e)
+
+def sources():
+    result = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'a4input*.txt'))):
+        with open(path) as f:
+            result.append(f.read())
+    result += [big_source(20), queens(8), gcd_table(50)]
+    # Syntax errors at various depths
+    result += [source[:len(source) * k // 5] for source in result[:5] for k in (1, 2, 3)]
+    return result
+
+def stress(parser, programs, expected, threads, rounds):
+    errors = []
+    barrier = threading.Barrier(threads)
+
+    def work(seed):
+        rnd = random.Random(seed)
+        barrier.wait()
+        for _ in range(rounds):
+            order = list(range(len(programs)))
+            rnd.shuffle(order)
+            for i in order:
+                if outcome(parser, programs[i]) != expected[i]:
+                    errors.append(i)
+                    return
+
+    workers = [threading.Thread(target=work, args=(seed,)) for seed in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return errors, time.perf_counter() - start
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='shared parser thread stress test')
+    args.add_argument('--threads', type=int, default=16)
+    args.add_argument('--rounds', type=int, default=20, help='parses of every source per thread')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    programs = sources()
+    print('%-22s %8s %8s %12s' % ('lexer', 'threads', 'parses', 'parses/s'))
+    for cls in (Parser, ContextSensitive, Cached):
+        expected = [outcome(cls(), source) for source in programs]
+        parser = cls()
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            errors, elapsed = stress(parser, programs, expected, args.threads, args.rounds)
+        finally:
+            sys.setswitchinterval(interval)
+        name = type(parser.lexer).__name__
+        if errors:
+            print('%-22s FAILED: source %d parsed differently' % (name, errors[0]))
+            sys.exit(1)
+        parses = args.threads * args.rounds * len(programs)
+        print('%-22s %8d %8d %12.0f' % (name, args.threads, parses, parses / elapsed))
@@ -0,0 +1,64 @@
+"""Pre-lexed token streams of tpg.CacheNamedGroupLexer.
+
+    python benchmarks/token_stream.py [--repeat 3]
+
+Parses MustScript sources with the MustScript grammar lexed by
+CacheNamedGroupLexer, once lexing the source and once starting from the
+token list saved next to it (the lexer's token_file), which is memory
+mapped back with no regular expression work.  Reports the time taken to
+start the lexer and to parse the whole source, which builds the tokens of a
+pre-lexed stream as the parser reaches them.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+from a4main import *
+from workloads import big_source
+
+class Cached(Parser):
+    __doc__ = 'set lexer = CacheNamedGroupLexer\n' + Parser.__doc__
+
+def run(action, source, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='pre-lexed token stream benchmark')
+    args.add_argument('--repeat', type=int, default=3, help='parses per source, the best is kept')
+    args = args.parse_args()
+    sys.setrecursionlimit(100000)
+    sources = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'a4input*.txt'))):
+        with open(path) as f:
+            sources.append((os.path.basename(path), f.read()))
+    sources += [('big_source 100', big_source(100)), ('big_source 1000', big_source(1000))]
+    parser = Cached()
+    print('%-16s %8s %9s %10s %10s %10s %10s %8s' % ('source', 'chars', 'bytes', 'lex s', 'mapped s',
+                                                     'parse s', 'mapped s', 'speedup'))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, source in sources:
+            token_file = os.path.join(directory, name + '.tokens')
+            parser.lexer.token_file = None
+            lex = run(parser.lexer.start, source, args.repeat)
+            parse = run(parser, source, args.repeat)
+            parser.lexer.token_file = token_file
+            parser(source)  # saves the token list
+            mapped_lex = run(parser.lexer.start, source, args.repeat)
+            mapped_parse = run(parser, source, args.repeat)
+            print('%-16s %8d %9d %10.4f %10.4f %10.4f %10.4f %7.2fx' % (
+                name, len(source), os.path.getsize(token_file), lex, mapped_lex,
+                parse, mapped_parse, parse / mapped_parse))
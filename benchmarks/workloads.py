@@ -0,0 +1,118 @@
+"""Scalable MustScript workloads for the benchmark suite.
+
+Each generator takes a size and returns the source of a program.  WORKLOADS
+lists (name, generator, default sizes, full sizes, whether to execute).
+"""
+
+def queens(n):
+    """All solutions of the n-queens puzzle, as in a4input4.txt."""
+    return '''{
+    n = %d;
+    s = [%s];
+    count = 0;
+
+    def queen(i) {
+        if (i == n)
+            count = count + 1;
+        if (i < n) {
+            j = 0;
+            while (j < n) {
+                safe = 1;
+                k = 0;
+                while (k < i and safe) {
+                    if (j==s[k] or j==s[k]+i-k or j==s[k]-i+k)
+                        safe = 0;
+                    k = k + 1; }
+                if (safe) {
+                    s[i] = j;
+                    queen(i+1); }
+                j = j + 1; } } }
+
+    queen(0);
+    print s;
+}
+''' % (n, ','.join(['0'] * n))
+
+def gcd_table(n):
+    """GCDs of n pairs by repeated subtraction, as in a4input2.txt."""
+    pairs = [(17 * i % 997 + 1, 31 * i % 1009 + 1) for i in range(n)]
+    return '''{
+    data = [ %s ];
+    result = [ %s ];
+
+    i = 0;
+    while (i < %d) {
+        a = data[i][0];
+        b = data[i][1];
+
+        if (a > 0) {
+            while (b > 0) {
+                if (a > b) {
+                    a = a - b;
+                }
+                if (not (a > b)) {
+                    b = b - a;
+                }
+            }
+        }
+
+        result[i] = a;
+        i = i + 1;
+    }
+
+    print result[%d];
+}
+''' % (', '.join('[ %d, %d ]' % p for p in pairs), ', '.join(['0'] * n), n, n - 1)
+
+def concat(n):
+    """A string built by n appends."""
+    return '''{
+    s = "";
+    i = 0;
+    while (i < %d) {
+        s = s + "x";
+        i = i + 1;
+    }
+    print s[%d];
+}
+''' % (n, n - 1)
+
+def recursion(n):
+    """A procedure recursing n calls deep, twice."""
+    return '''{
+    def down(d) {
+        if (d > 0) {
+            down(d - 1);
+        }
+    }
+    down(%d);
+    down(%d);
+    print %d;
+}
+''' % (n, n, n)
+
+def big_source(n):
+    """A program of about 10*n statements, only parsed and analyzed."""
+    procs = []
+    for i in range(n):
+        procs.append('''
+    # procedure number %d
+    def p%d(a, b) {
+        x = a + b * %d;
+        if (x > %d and not (a == b)) {
+            y = [x, a, b, "p%d"];
+            print y[0];
+        }
+        while (x > 0) { x = x - 1; }
+        p%d(x, b);
+    }''' % (i, i, i, i, i, (i + 1) % n))
+    return '{%s\n    p0(1, 2);\n}\n' % ''.join(procs)
+
+# name, generator, default sizes, --full sizes, execute
+WORKLOADS = [
+    ('queens', queens, [8, 9], [8, 9, 10, 11, 12], True),
+    ('gcd_table', gcd_table, [100, 1000], [100, 1000, 5000], True),
+    ('concat', concat, [10000, 100000], [10000, 100000, 1000000], True),
+    ('recursion', recursion, [100, 500], [100, 500, 2000], True),
+    ('big_source', big_source, [100, 1000], [100, 1000, 5000], False),
+]
@@ -0,0 +1,85 @@
+"""Tests of the binary format of ASTs."""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4ast
+import a4main
+
+DEPTH = 2000
+
+def parse_deep(source):
+    """Parse source, which nests too deep for the default recursion limit."""
+    depth = sys.getrecursionlimit()
+    sys.setrecursionlimit(100000)
+    try:
+        return a4main.parse(source)
+    finally:
+        sys.setrecursionlimit(depth)
+
+class AstFormatTest(unittest.TestCase):
+
+    def roundtrip(self, tree):
+        data = a4ast.dumps(tree)
+        loaded = a4ast.loads(data)
+        self.assertEqual(a4ast.dumps(loaded), data)
+        return loaded
+
+    def test_program(self):
+        interp = a4main.Interpreter()
+        program = interp.load(open(os.path.join(ROOT, 'a4input4.txt')).read())
+        tree = self.roundtrip(program.node)
+        proc_env = {}
+        tree.anlz_procs(proc_env)
+        expected, _ = interp.run(open(os.path.join(ROOT, 'a4input4.txt')).read())
+        output = []
+        interp.write = output.append
+        interp.run_program(a4main.Program(tree, proc_env, program.pure_procs))
+        self.assertEqual(output, expected)
+
+    def test_deep_tree(self):
+        tree = parse_deep('print ' + '(1+' * DEPTH + '1' + ')' * DEPTH + ';')
+        loaded = self.roundtrip(tree)
+        exp, depth = loaded.exp, 0
+        while isinstance(exp, a4main.BinOpExp):
+            self.assertEqual((exp.left.value, exp.op), (1, '+'))
+            exp, depth = exp.right, depth + 1
+        self.assertEqual((depth, exp.value), (DEPTH, 1))
+
+    def test_deep_block(self):
+        tree = parse_deep('{' * DEPTH + 'x = [1, "a"];' + '}' * DEPTH)
+        loaded = self.roundtrip(tree)
+        for _ in range(DEPTH - 1):
+            loaded, = loaded.stmts
+        self.assertEqual([e.value for e in loaded.stmts[0].right.elements], [1, 'a'])
+
+    def test_shared_nodes(self):
+        interp = a4main.Interpreter()
+        program = interp.load('{ i = 0; n = 10; while (i < n * 2) { i = i + n * 2; } print i; }')
+        loaded = self.roundtrip(program.node)
+        self.assertIsInstance(loaded.stmts[2], a4main.HoistingWhile)
+        hoisted = loaded.stmts[2].hoisted
+        self.assertTrue(hoisted)
+        self.assertIs(loaded.stmts[2].exp.right, hoisted[0])
+
+    def test_values(self):
+        for v in [0, 1, -1, 63, 64, -64, 127, 128, -129, 2**70, -2**70]:
+            self.assertEqual(self.roundtrip(a4main.Int(v)).value, v)
+        node = a4main.Var('x' * 300)
+        node.line, node.column = 5000, 200
+        loaded = self.roundtrip(node)
+        self.assertEqual((loaded.name, loaded.line, loaded.column), (node.name, 5000, 200))
+
+    def test_errors(self):
+        self.assertRaises(ValueError, a4ast.dumps, a4main.Int(True))
+        self.assertRaises(ValueError, a4ast.dumps, a4main.Int(1.5))
+        data = a4ast.dumps(a4main.Int(1))
+        for bad in [b'', b'MSAST', data[:-1], data + b'\x00']:
+            self.assertRaises(ValueError, a4ast.loads, bad)
+
+if __name__ == '__main__':
+    unittest.main()
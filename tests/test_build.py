@@ -0,0 +1,46 @@
+"""Tests of parsing many files with a4build."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4build
+import a4main
+
+class BuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for i, source in enumerate(['print 1+2;', '{ a = [1, 2]; print a[1]; }', 'print ;']):
+            self.paths.append(os.path.join(self.dir, '%d.txt' % i))
+            with open(self.paths[-1], 'w') as f:
+                f.write(source)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, trees):
+        self.assertEqual(sorted(trees), sorted(self.paths))
+        self.assertIsInstance(trees[self.paths[0]], a4main.Print)
+        self.assertIsInstance(trees[self.paths[1]], a4main.Block)
+        self.assertEqual(trees[self.paths[2]], 'Parsing Error')
+
+    def test_in_process(self):
+        depth = sys.getrecursionlimit()
+        self.check(a4build.parse_files(self.paths, workers=1))
+        self.assertEqual(a4build.parse_files(self.paths[:1])[self.paths[0]].__class__, a4main.Print)
+        self.assertEqual(sys.getrecursionlimit(), depth)
+
+    def test_pool(self):
+        depth = sys.getrecursionlimit()
+        self.check(a4build.parse_files(self.paths, workers=2))
+        self.assertEqual(sys.getrecursionlimit(), depth)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Tests of the step budget and allocation budget of the interpreter."""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+
+PAIRS = '{ i = 0; while (i < 2000) { a = [i, i]; i = i + 1; } print i; }'
+
+class LimitTest(unittest.TestCase):
+
+    def run_code(self, code, **limits):
+        return a4main.Interpreter(**limits).run(code)
+
+    def test_steps(self):
+        self.assertEqual(self.run_code('{ while (1) { } }', max_steps=10000),
+                         ([], 'Steps Limit Exceeded'))
+        self.assertEqual(self.run_code('print 1;', max_steps=10000), (['1'], None))
+
+    def test_dropped_values_are_charged(self):
+        # Each [i, i] is dropped by the next iteration, but the budget counts
+        # every byte allocated.
+        interp = a4main.Interpreter(max_alloc=100000)
+        self.assertEqual(interp.run(PAIRS), ([], 'Allocation Limit Exceeded'))
+        interp = a4main.Interpreter(max_alloc=2000 * 72)
+        self.assertEqual(interp.run(PAIRS), (['2000'], None))
+        self.assertEqual(interp.stats()['allocated'], 2000 * 72)
+
+    def test_string_growth(self):
+        code = '{ s = "ab"; while (1) { s = s + s; } }'
+        self.assertEqual(self.run_code(code, max_alloc=10**6), ([], 'Allocation Limit Exceeded'))
+
+    def test_memoized_calls_are_charged(self):
+        code = '''{
+            def f(n) { a = [n, n, n]; }
+            i = 0;
+            while (i < 100) { f(1); i = i + 1; }
+            print i;
+        }'''
+        interp = a4main.Interpreter(max_alloc=10**6)
+        self.assertEqual(interp.run(code), (['100'], None))
+        self.assertGreater(interp.stats()['memo_hits'], 0)
+        self.assertEqual(interp.stats()['allocated'], 100 * 80)
+        self.assertEqual(self.run_code(code, max_alloc=50 * 80), ([], 'Allocation Limit Exceeded'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,257 @@
+"""Tests of the optimizations of the interpreter.
+
+Programs run with every optimization, type specialization, specialized
+stores, loop-invariant code motion, memoized pure procedures and compiled
+loops, must print the same lines, fail the same way, take the same steps,
+allocate the same bytes and leave the same global variables as with none.
+"""
+
+import os
+import random
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+
+class Plain(a4main.Interpreter):
+    """The interpreter without optimizations: the analysis only collects
+    procedures and costs, loops are never compiled and calls never
+    memoized.
+    """
+
+    def __init__(self, **limits):
+        a4main.Interpreter.__init__(self, jit_threshold=None, memo_size=0, **limits)
+
+    def analyze(self, node):
+        self.proc_env = {}
+        node.anlz_procs(self.proc_env)
+        node.anlz_costs()
+        self.pure_procs = {}
+        return node
+
+def outcome(interp, source):
+    try:
+        output, error = interp.run(source)
+    except Exception as e:
+        # The interpreter lets Python errors of some programs through, such
+        # as the TypeError of an index that is a string.
+        output, error = None, type(e).__name__
+    stats = interp.stats()
+    # Arrays are compared as printed: slices of them may be views.
+    return (output, error, stats['steps'], stats['allocated'],
+            sorted((name, repr(v)) for name, v in interp.global_var_env.items()))
+
+class Generator(object):
+    """Random programs of loops, procedure calls, arrays and strings, where
+    variables hold values of several types and procedures read globals.
+    """
+
+    VARS = ['a', 'b', 'c', 'd']
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def exp(self, depth):
+        r = self.random
+        if depth <= 0 or r.random() < 0.35:
+            k = r.random()
+            if k < 0.55: return r.choice(self.VARS + ['i', 'j'])
+            if k < 0.95: return str(r.randint(0, 4))
+            return r.choice(['"x"', 'arr', 'u', 'st'])
+        k = r.random()
+        if k < 0.65:
+            op = r.choice(['+', '-', '+', '-', '<', '>', '==', 'and', 'or', '/', '*'])
+            return '(%s %s %s)' % (self.exp(depth - 1), op, self.exp(depth - 1))
+        if k < 0.75: return 'not %s' % self.exp(depth - 1)
+        if k < 0.85: return '%s[%s]' % (r.choice(['arr', 'st', 'view']), self.exp(depth - 1))
+        if k < 0.95: return '%s[%s:%s]' % (r.choice(['arr', 'st']), self.exp(0), self.exp(0))
+        return '[%s, 1]' % self.exp(depth - 1)
+
+    def stmt(self, depth, calls='g'):
+        r = self.random
+        k = r.random()
+        if depth <= 0 or k < 0.45:
+            k = r.random()
+            if k < 0.1: return 'arr[%s] = %s;' % (self.exp(1), self.exp(2))
+            if k < 0.15: return 'view[%s] = %s;' % (self.exp(1), self.exp(1))
+            if k < 0.2: return 'st = st + %s;' % r.choice(['"x"', 'st', '"yy"'])
+            return '%s = %s;' % (r.choice(self.VARS + ['u']), self.exp(2))
+        if k < 0.55: return 'print %s;' % self.exp(2)
+        if k < 0.7: return 'if (%s) %s' % (self.exp(2), self.stmt(depth - 1, calls))
+        if k < 0.9:
+            v = r.choice(['i', 'j'])
+            cond = r.choice(['', 'and ' + self.exp(1), 'or 0'])
+            body = ' '.join(self.stmt(depth - 1, calls) for _ in range(r.randint(1, 3)))
+            return '{ %s = 0; while (%s < %d %s) { %s %s = %s + 1; } }' % (
+                v, v, r.randint(0, 150), cond, body, v, v)
+        if k < 0.95: return '%s(%s);' % (calls, self.exp(1))
+        return '{ %s }' % ' '.join(self.stmt(depth - 1, calls) for _ in range(r.randint(0, 3)))
+
+    def program(self):
+        r = self.random
+        init = 'a = 1; b = 2; c = 3; d = 0; i = 0; j = 0; st = "%s";' % ('s' * r.randint(0, 80))
+        # view shares the list of arr, so stores into either change both
+        init += ' arr = [%s]; view = arr[1:70];' % ', '.join(str(n % 7) for n in range(80))
+        if r.random() < 0.3: init += ' c = "k";'
+        # g calls h, which may be pure or print
+        g = 'def g(p) { %s }' % ' '.join(self.stmt(2, 'h') for _ in range(3))
+        h = r.choice(['def h(q) { print q; }', 'def h(q) { x = q + a; }', 'def h(q) { x = 10 / q; }'])
+        body = ' '.join(self.stmt(3) for _ in range(r.randint(1, 5)))
+        return '{ %s %s %s %s }' % (g, h, init, body)
+
+class OptimizationTest(unittest.TestCase):
+
+    def check(self, source, **limits):
+        limits.setdefault('max_steps', 100000)
+        expected = outcome(Plain(**limits), source)
+        for threshold in (None, 1, 100):
+            actual = outcome(a4main.Interpreter(jit_threshold=threshold, **limits), source)
+            self.assertEqual(actual, expected, '%s\njit_threshold=%s' % (source, threshold))
+        return expected
+
+    def test_generated_programs(self):
+        generator = Generator(20240601)
+        for _ in range(100):
+            source = generator.program()
+            for steps in (1000, 20000):
+                self.check(source, max_steps=steps, max_alloc=50000)
+
+    def test_aliasing_through_index_assign(self):
+        # Nothing read through a, or a slice of it, is invariant in loops
+        # storing through b.
+        output = self.check('''{
+            a = [1, 2, 3]; b = a; i = 0; x = 0;
+            while (i < 200) { b[0] = i; x = x + a[0] * 2; i = i + 1; }
+            print x; print a;
+        }''')[0]
+        self.assertEqual(output, [str(sum(range(200)) * 2), '[199, 2, 3]'])
+        self.check('''{
+            a = [%s]; v = a[10:80]; w = v[5:60]; i = 0; t = 0;
+            while (i < 300) { w[1] = i; t = t + a[16] + v[6]; a[16] = t; i = i + 1; }
+            print t; print v[6]; print w[1];
+        }''' % ', '.join(['0'] * 100))
+        self.check('''{
+            a = [[0, 1], [2, 3]]; b = a[0]; i = 0; t = 0;
+            while (i < 200) { b[1] = i; t = t + a[0][1]; i = i + 1; }
+            print t;
+        }''')
+        self.check('''{
+            def set(p) { arr[0] = p; }
+            arr = [0, 0]; i = 0; t = 0;
+            while (i < 200) { set(i); t = t + arr[0] + arr[1]; i = i + 1; }
+            print t;
+        }''')
+
+    def test_globals_changed_in_loops(self):
+        self.check('''{
+            n = 1; i = 0; t = 0;
+            while (i < 200) { t = t + n * 3; n = n + 1; i = i + 1; }
+            print t; print n;
+        }''')
+        # The loop of f reads k, which the loop calling f changes.
+        self.check('''{
+            def f(m) { j = 0; s = 0; while (j < m) { s = s + k * 2; j = j + 1; } print s; }
+            k = 0;
+            while (k < 150) { f(3); k = k + 1; }
+        }''')
+        # n is an int until the loop makes it a string.
+        self.check('''{
+            n = 1; i = 0;
+            while (i < 200) { if (i == 150) n = "x"; t = n + n; i = i + 1; }
+            print t;
+        }''')
+
+    def test_allocations_in_loops(self):
+        # Array literals and concatenations allocate at every iteration, so
+        # they are not evaluated once before the loop.
+        for exp in ('s + "x"', '[n, n]', 's[0:n] + s', '[s + s, n]'):
+            self.check('''{
+                s = "abc"; n = 2; i = 0;
+                while (i < 200) { t = %s; i = i + 1; }
+                print t;
+            }''' % exp, max_alloc=20000)
+
+    def test_hoisting_root_loop(self):
+        # A program of one loop hoists its invariants too.
+        source = 'while (i < n * 2) { i = i + 1; }'
+        node = a4main.Interpreter().load(source).node
+        self.assertIs(type(node), a4main.HoistingWhile)
+        self.assertEqual(len(node.hoisted), 1)
+        self.assertEqual(self.check(source)[1], 'Evaluation Error')
+
+    def test_memoized_procedures(self):
+        # Calls of pure procedures still take their steps, allocate and fail.
+        source = '''{
+            def pure(n) { a = [n, n]; x = 10 / n + g; }
+            def loud(n) { print n; }
+            def mixed(n) { pure(n); loud(n); }
+            g = 1; i = 0;
+            while (i < 400) { pure(3 - i / 100); mixed(i / 100 + 1); i = i + 1; }
+        }'''
+        output, error = self.check(source)[:2]
+        self.assertEqual((len(output), error), (300, 'Evaluation Error'))
+        interp = a4main.Interpreter()
+        interp.run(source)
+        self.assertGreater(interp.stats()['memo_hits'], 0)
+        # Calls reading a global are remembered for each of its values.
+        self.check('''{
+            def f(n) { x = 1 / (n - g); }
+            g = 0; i = 0;
+            while (i < 300) { f(5); g = i / 60; i = i + 1; }
+        }''')
+        for steps in range(100, 3000, 290):
+            self.check(source, max_steps=steps)
+        self.check(source, max_alloc=5000)
+
+    def test_compiled_loops_hit_step_limit(self):
+        source = '''{
+            def f(n) { s = 0; j = 0; while (j < n) { s = s + j; j = j + 1; } print s; }
+            a = [0, 0, 0]; i = 0; t = 0;
+            while (i < 1000) { t = t + i; a[i / 400] = t; if (i / 100 * 100 == i) f(i / 10); i = i + 1; }
+            print t;
+        }'''
+        for steps in list(range(50, 400, 37)) + list(range(1000, 20000, 1733)):
+            self.assertEqual(self.check(source, max_steps=steps)[1], 'Steps Limit Exceeded')
+        self.assertIsNone(self.check(source)[1])
+
+    def test_compiled_variable_names(self):
+        # Python identifiers are NFKC normalized: xﬁ, with the ligature ﬁ,
+        # would be the same Python local as xfi.
+        output = self.check('''{
+            xfi = 1; xﬁ = 100; i = 0; t = 0;
+            while (i < 200) { t = t + xfi * 1000 + xﬁ; i = i + 1; }
+            print t;
+        }''')[0]
+        self.assertEqual(output, ['220000'])
+
+    def test_specialized_root(self):
+        # A program of one statement is specialized too.
+        interp = a4main.Interpreter()
+        self.assertIs(type(interp.load('x = 1;').node), a4main.GlobalAssign)
+        self.assertIs(type(interp.load('print 1 + 2;').node.exp), a4main.IntAdd)
+        self.check('x = 1;')
+
+    def test_specialized_nodes(self):
+        source = '''{
+            def f(p) { q = p * 2; r[0] = q; print q; }
+            i = 0; s = "a"; r = [0]; t = 0;
+            while (i < 5) { t = t + i; s = s + "b"; f(i); i = i + 1; }
+            print t; print s; print r;
+        }'''
+        node = a4main.Interpreter().load(source).node
+        kinds = set()
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            kinds.add(type(n))
+            stack.extend(n.children())
+        for kind in (a4main.IntAdd, a4main.StrAdd, a4main.LocalAssign, a4main.GlobalAssign,
+                     a4main.IndexAssign):
+            self.assertIn(kind, kinds)
+        self.check(source)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Tests of the execution profiler."""
+
+import io
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+from a4profile import Profiler
+
+SOURCE = '''{
+    def f(n) { a = [n]; a[0] = n * 2; print a[0]; }
+    i = 0; k = 3;
+    while (i < 5) { f(i + k); i = i + 1; }
+}'''
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.interp = a4main.Interpreter(write=lambda text: None)
+        self.profiler = Profiler(self.interp.load(SOURCE))
+        self.profiler.run(self.interp)
+
+    def test_labels_name_source_statements(self):
+        kinds = set(type(s.stmt) for s in self.profiler.stmts)
+        self.assertTrue(kinds >= set([a4main.HoistingWhile, a4main.LocalAssign,
+                                      a4main.GlobalAssign, a4main.IndexAssign]))
+        labels = dict((s.label(), s.count) for s in self.profiler.stmts)
+        self.assertEqual(labels, {'2:16 Assign': 5, '2:25 Assign': 5, '2:39 Print': 5,
+                                  '3:5 Assign': 1, '3:12 Assign': 1, '4:5 While': 1,
+                                  '4:21 Call': 5, '4:31 Assign': 5})
+
+    def test_report(self):
+        out = io.StringIO()
+        self.profiler.report(out=out)
+        report = out.getvalue()
+        self.assertIn('4:5 While', report)
+        for name in ('HoistingWhile', 'LocalAssign', 'GlobalAssign', 'IndexAssign'):
+            self.assertNotIn(name, report)
+        out = io.StringIO()
+        self.profiler.write_collapsed(out)
+        self.assertIn('<main>;f;2:39_Print ', out.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
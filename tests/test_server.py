@@ -0,0 +1,105 @@
+"""Tests of the requests the evaluation server answers."""
+
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import a4main
+from a4server import AsyncServer, Server
+
+class LateAlarmServer(Server):
+    """A server whose alarm goes off just as the program has ended."""
+
+    def stop_timer(self):
+        Server.stop_timer(self)
+        raise a4main.LimitError('Time')
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+
+    def answer(self, line):
+        return json.loads(self.server.handle_line(line))
+
+    def test_run(self):
+        response = self.answer('{"id": 1, "source": "print 1+2;"}')
+        self.assertEqual(response['id'], 1)
+        self.assertEqual(response['output'], ['3'])
+        self.assertIsNone(response['error'])
+
+    def test_malformed_requests(self):
+        for line in ['[1, 2]', '5', 'null', '"print 1;"',
+                     '{"id": 2, "source": 5}',
+                     '{"id": 2, "source": ["print 1;"]}',
+                     '{"id": 2, "source": "print 1;", "timeout": "x"}',
+                     '{"id": 2, "source": "print 1;", "timeout": 0}',
+                     '{"id": 2, "source": "print 1;", "timeout": -1}',
+                     '{"id": 2, "source": "print 1;", "timeout": true}',
+                     'not json']:
+            response = self.answer(line)
+            self.assertEqual(response['error'], 'Bad Request', line)
+            self.assertEqual(response['output'], [])
+        # The server still answers after them.
+        self.assertEqual(self.answer('{"id": 3, "source": "print 4;"}')['output'], ['4'])
+
+    def test_id_of_malformed_request(self):
+        self.assertEqual(self.answer('{"id": 7, "source": 5}')['id'], 7)
+        self.assertIsNone(self.answer('[7]')['id'])
+
+    def test_timeout(self):
+        response = self.answer('{"id": 4, "source": "while (1) { }", "timeout": 0.05}')
+        self.assertEqual(response['error'], 'Time Limit Exceeded')
+
+    def test_null_timeout_is_the_default(self):
+        self.server = Server(timeout=0.05)
+        response = self.answer('{"id": 4, "source": "while (1) { }", "timeout": null}')
+        self.assertEqual(response['error'], 'Time Limit Exceeded')
+
+    def test_python_errors(self):
+        for source in ['{ x = 1; x[0] = 2; }', '{ a = [1, 2]; a["x"] = 1; }']:
+            response = self.answer(json.dumps({'id': 8, 'source': source}))
+            self.assertEqual(response['error'], 'Evaluation Error', source)
+        self.assertEqual(self.answer('{"id": 9, "source": "print 4;"}')['output'], ['4'])
+
+    def test_alarm_after_run(self):
+        self.server = LateAlarmServer()
+        response = self.answer('{"id": 5, "source": "print 1;"}')
+        self.assertEqual(response['error'], 'Time Limit Exceeded')
+
+    def test_malformed_async_request(self):
+        responses = []
+        asyncio.run(AsyncServer().handle_async({"id": 6, "source": 5}, responses.append))
+        self.assertEqual(responses, [{'id': 6, 'output': None, 'error': 'Bad Request', 'done': True}])
+        responses = []
+        asyncio.run(AsyncServer().handle_async([6], responses.append))
+        self.assertEqual(responses[0]['error'], 'Bad Request')
+
+    def answer_async(self, server, request):
+        responses = []
+        asyncio.run(server.handle_async(request, responses.append))
+        return responses
+
+    def test_async(self):
+        responses = self.answer_async(AsyncServer(), {'id': 1, 'source': 'print 1+2;'})
+        self.assertEqual(responses, [{'id': 1, 'line': '3'},
+                                     {'id': 1, 'output': None, 'error': None, 'cached': False,
+                                      'done': True}])
+
+    def test_async_null_timeout_is_the_default(self):
+        responses = self.answer_async(AsyncServer(timeout=0.05),
+                                      {'id': 2, 'source': 'while (1) { }', 'timeout': None})
+        self.assertEqual(responses[-1]['error'], 'Time Limit Exceeded')
+
+    def test_async_python_errors(self):
+        responses = self.answer_async(AsyncServer(), {'id': 3, 'source': '{ x = 1; x[0] = 2; }'})
+        self.assertEqual(responses[-1]['error'], 'Evaluation Error')
+        self.assertTrue(responses[-1]['done'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests of one MustScript parser shared by several threads.
+
+A short version of benchmarks/thread_stress.py: every parse runs in its own
+context, so each thread, parsing through the same parser with each lexer,
+must get the trees and syntax errors of a parse made alone.
+"""
+
+import glob
+import os
+import pickle
+import random
+import sys
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+# The actions of the grammar name the nodes of a4main in the module of the
+# parser class.
+from a4main import *
+
+class ContextSensitive(Parser):
+    __doc__ = 'set lexer = ContextSensitiveLexer\n' + Parser.__doc__
+
+class Cached(Parser):
+    __doc__ = 'set lexer = CacheNamedGroupLexer\n' + Parser.__doc__
+
+def outcome(parser, source):
+    """Return the pickled tree of source, or its syntax error."""
+    try:
+        return pickle.dumps(parser(source))
+    except tpg.Error as e:
+        return str(e)
+
+def sources():
+    result = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'a4input*.txt'))):
+        with open(path) as f:
+            result.append(f.read())
+    result.append('{ %s }' % ' '.join('def f%d(n) { while (n > %d) { n = n - 1; print [n, "s"][0]; } }'
+                                      % (i, i) for i in range(20)))
+    # Syntax errors at various depths
+    result += [source[:len(source) * k // 3] for source in result for k in (1, 2)]
+    return result
+
+class SharedParserTest(unittest.TestCase):
+
+    THREADS = 4
+    ROUNDS = 3
+
+    def check(self, cls):
+        programs = sources()
+        expected = [outcome(cls(), source) for source in programs]
+        parser = cls()
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def work(seed):
+            rnd = random.Random(seed)
+            barrier.wait()
+            for _ in range(self.ROUNDS):
+                order = list(range(len(programs)))
+                rnd.shuffle(order)
+                for i in order:
+                    if outcome(parser, programs[i]) != expected[i]:
+                        errors.append(programs[i])
+                        return
+
+        workers = [threading.Thread(target=work, args=(seed,)) for seed in range(self.THREADS)]
+        interval = sys.getswitchinterval()
+        # Switch threads as often as possible to interleave the parses.
+        sys.setswitchinterval(1e-6)
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [], type(parser.lexer).__name__)
+
+    def test_lexer(self):
+        self.check(Parser)
+
+    def test_context_sensitive_lexer(self):
+        self.check(ContextSensitive)
+
+    def test_cache_named_group_lexer(self):
+        self.check(Cached)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Tests of the token lists CacheNamedGroupLexer saves and maps back."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpg
+
+class Sum(tpg.Parser):
+    r"""
+    set lexer = CacheNamedGroupLexer
+    separator spaces: '\s+' ;
+    token number: '\d+' int ;
+
+    START/n -> number/n ( '\+' number/m  $ n = n + m $ )* ;
+    """
+
+class Concat(tpg.Parser):
+    r"""
+    set lexer = CacheNamedGroupLexer
+    separator spaces: '\s+' ;
+    token number: '\d+' ;
+
+    START/n -> number/n ( '\+' number/m  $ n = n + m $ )* ;
+    """
+
+class Tripwire(object):
+    """Stands for the regular expression of a lexer that must not lex."""
+
+    def __init__(self, regexp):
+        self.pattern = regexp.pattern
+
+    def match(self, *args):
+        raise AssertionError('token_re.match called')
+
+class TokenStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.token_file = os.path.join(self.directory.name, 'input.tokens')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def parser(self, cls):
+        parser = cls()
+        parser.lexer.token_file = self.token_file
+        return parser
+
+    def test_parse_from_token_file_does_not_lex(self):
+        parser = self.parser(Sum)
+        source = '1 + 20\n+ 300'
+        self.assertEqual(parser(source), 321)
+        self.assertTrue(os.path.exists(self.token_file))
+        parser.lexer.token_re = Tripwire(parser.lexer.token_re)
+        self.assertEqual(parser(source), 321)
+
+    def test_parse_without_token_file_does_not_lex_again(self):
+        # The cached lexer lexes the whole input once, in start.
+        parser = Sum()
+        parser.lexer.token_file = None
+        lexer = parser.lexer.fork()
+        lexer.start('1 + 2 + 3')
+        lexer.token_re = Tripwire(lexer.token_re)
+        tokens = []
+        while not isinstance(lexer.token(), tpg.EOFToken):
+            tokens.append(lexer.token().text)
+            lexer.next_token()
+        self.assertEqual(tokens, ['1', '+', '2', '+', '3'])
+
+    def test_tokens_read_back_equal_tokens_lexed(self):
+        parser = self.parser(Sum)
+        source = '1 +\n 22 + 333 '
+        parser(source)
+        lexed = parser.lexer.fork()
+        lexed.token_file = None
+        lexed.start(source)
+        mapped = parser.lexer.fork()
+        mapped.start(source)
+        self.assertIsInstance(mapped.cache, tpg.TokenStream)
+        self.assertEqual(len(lexed.cache), len(mapped.cache))
+        for a, b in zip(lexed.cache, mapped.cache):
+            self.assertEqual(type(a), type(b))
+            for attribute in ('name', 'text', 'value', 'line', 'column', 'end_line', 'end_column',
+                              'start', 'stop', 'prev_stop', 'index'):
+                self.assertEqual(getattr(a, attribute), getattr(b, attribute))
+
+    def test_other_input_is_lexed(self):
+        parser = self.parser(Sum)
+        self.assertEqual(parser('1 + 2'), 3)
+        self.assertEqual(parser('1 + 3'), 4)
+
+    def test_other_value_functions_are_lexed(self):
+        source = '1 + 2'
+        self.assertEqual(self.parser(Sum)(source), 3)
+        self.assertEqual(self.parser(Concat)(source), '12')
+        self.assertEqual(self.parser(Sum)(source), 3)
+
+    def test_token_version(self):
+        parser = self.parser(Sum)
+        parser('1 + 2')
+        lexer = parser.lexer.fork()
+        crc = lexer.spec_crc()
+        lexer.token_version = 1
+        self.assertNotEqual(lexer.spec_crc(), crc)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -51,17 +51,17 @@ __author__ = 'Christophe Delord'
 __email__ = 'cdsoft.fr'
 __url__ = 'http://cdsoft.fr/tpg/'
 
-import parser
+import marshal
+import os
 import re
-import sre_parse
+import struct
 import sys
+import zlib
 
 # Python 2/3 compatibility
 __python__ = sys.version_info[0]
 
 if __python__ == 3:
-    import collections
-    callable = lambda value: isinstance(value, collections.Callable)
     exc = lambda: sys.exc_info()[1]
 
 if __python__ == 2:
@@ -167,6 +167,132 @@ class LexerOptions:
         """
         return expr
 
+    def fork(self):
+        """ return a new lexer sharing the token definitions of this lexer
+
+        The definitions are built first and must not change afterwards.
+        The new lexer only adds the state of its own lexical analyses
+        (input, position, current token, ...), so forking is cheap.
+        """
+        self.build()
+        lexer = self.__class__.__new__(self.__class__)
+        lexer.__dict__.update(self.__dict__)
+        return lexer
+
+class _Unknown(Exception):
+    pass
+
+_ascii = frozenset(chr(i) for i in range(128))
+
+# The parser of regular expressions is only needed to analyse them,
+# it is imported by import_sre_parse when first needed.
+sre_parse = None
+
+def import_sre_parse():
+    """ import the parser of regular expressions of the re module
+    """
+    global sre_parse, _categories, _repeats
+    if sre_parse is None:
+        try:
+            from re import _parser as module   # Python 3.11 and later
+        except ImportError:
+            import sre_parse as module
+        _categories = {
+            module.CATEGORY_DIGIT: r"\d", module.CATEGORY_NOT_DIGIT: r"\D",
+            module.CATEGORY_SPACE: r"\s", module.CATEGORY_NOT_SPACE: r"\S",
+            module.CATEGORY_WORD: r"\w", module.CATEGORY_NOT_WORD: r"\W",
+        }
+        _repeats = [module.MAX_REPEAT, module.MIN_REPEAT]
+        if hasattr(module, "POSSESSIVE_REPEAT"):
+            _repeats.append(module.POSSESSIVE_REPEAT)
+        sre_parse = module
+    return sre_parse
+
+def first_chars(regexp):
+    """ return the characters a non empty match of a compiled regular expression can start with
+
+    The result is a pair (chars, non_ascii) where chars is the set of ASCII
+    characters and non_ascii is True if other characters may start a match.
+    It may contain characters that start no match but never misses one.
+    None is returned when the set can not be computed (case insensitive
+    expressions, back references, ...).
+    """
+    flags = regexp.flags
+    import_sre_parse()
+    try:
+        items = sre_parse.parse(regexp.pattern, flags)
+        if (flags | items.state.flags) & re.IGNORECASE:
+            return None
+        chars, non_ascii, _ = _first_seq(items, flags)
+    except (_Unknown, re.error, AttributeError):
+        return None
+    return chars, non_ascii
+
+def _first_seq(items, flags):
+    """ return (chars, non_ascii, nullable) for a sequence of sre_parse items
+    """
+    chars, non_ascii = set(), False
+    for op, av in items:
+        c, n, nullable = _first_item(op, av, flags)
+        chars |= c
+        non_ascii = non_ascii or n
+        if not nullable:
+            return chars, non_ascii, False
+    return chars, non_ascii, True
+
+def _first_item(op, av, flags):
+    """ return (chars, non_ascii, nullable) for one sre_parse item
+    """
+    if op == sre_parse.LITERAL:
+        if av < 128:
+            return set([chr(av)]), False, False
+        return set(), True, False
+    if op == sre_parse.NOT_LITERAL or op == sre_parse.ANY:
+        return set(_ascii), True, False
+    if op == sre_parse.IN:
+        chars, negate, non_ascii = set(), False, False
+        for op2, av2 in av:
+            if op2 == sre_parse.NEGATE:
+                negate = non_ascii = True
+            elif op2 == sre_parse.LITERAL:
+                if av2 < 128:
+                    chars.add(chr(av2))
+                else:
+                    non_ascii = True
+            elif op2 == sre_parse.RANGE:
+                chars.update(chr(i) for i in range(av2[0], min(av2[1]+1, 128)))
+                non_ascii = non_ascii or av2[1] >= 128
+            elif op2 == sre_parse.CATEGORY and av2 in _categories:
+                category = re.compile(_categories[av2], flags & re.ASCII)
+                chars.update(c for c in _ascii if category.match(c))
+                non_ascii = True
+            else:
+                raise _Unknown()
+        if negate:
+            chars = set(_ascii) - chars
+        return chars, non_ascii, False
+    if op == sre_parse.BRANCH:
+        chars, non_ascii, nullable = set(), False, False
+        for alternative in av[1]:
+            c, n, e = _first_seq(alternative, flags)
+            chars |= c
+            non_ascii = non_ascii or n
+            nullable = nullable or e
+        return chars, non_ascii, nullable
+    if op == sre_parse.SUBPATTERN:
+        if len(av) == 4 and av[1] & re.IGNORECASE:
+            raise _Unknown()
+        return _first_seq(av[-1], flags)
+    if op in _repeats:
+        chars, non_ascii, nullable = _first_seq(av[2], flags)
+        return chars, non_ascii, nullable or av[0] == 0
+    if op == getattr(sre_parse, "ATOMIC_GROUP", None):
+        return _first_seq(av, flags)
+    if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        # zero width assertions only restrict the matches
+        return set(), False, True
+    raise _Unknown()
+
 class NamedGroupLexer(LexerOptions):
     r""" NamedGroupLexer(word_bounded, compile_options)
 
@@ -233,6 +359,11 @@ class NamedGroupLexer(LexerOptions):
         else:
             raise SemanticError("Duplicate token definition (%s)"%name)
 
+    def value_functions(self):
+        """ return the functions computing the values of the tokens and separators
+        """
+        return [value for name, (value, is_real_token) in self.tokens.items()]
+
     def build(self):
         """ build the token_re attribute from the tokens and separators
         """
@@ -335,6 +466,8 @@ class Lexer(NamedGroupLexer):
         - based on NamedGroupLexer
         - doesn't use named group regular expressions (slower but not limited to 100 tokens)
         - select the longuest match so the order of token definitions doesn't mater
+          (the first defined token wins when several have the longuest match)
+        - only try the tokens that can start with the current character
 
     Attributes:
         tokens : list (name, regexp, value, is_real_token)
@@ -343,6 +476,9 @@ class Lexer(NamedGroupLexer):
                         value is a function that computes the value of a token from its text
                         is_real_token is a boleean. True for tokens, False for separators
     Once the lexer is started more attributes are defined:
+        dispatch   : dictionnary ASCII character -> tuple of the tokens
+                     (in the order of self.tokens) that can start with it
+        non_ascii  : tuple of the tokens that can start with other characters
         input      : input string being parsed
         max_pos    : maximum position reached in the input string
         last_token : last token reached in the input string
@@ -355,6 +491,7 @@ class Lexer(NamedGroupLexer):
     def __init__(self, wb, compile_options):
         LexerOptions.__init__(self, wb, compile_options)
         self.tokens = []        # [(name, regexp, value, is_real_token)]
+        self.dispatch = None
 
     def def_token(self, name, expr, value=_id):
         """ adds a new token to the lexer
@@ -371,6 +508,7 @@ class Lexer(NamedGroupLexer):
             value = lambda _, value=value: value
         if name not in self.tokens:
             self.tokens.append((name, self.re_compile(self.word_bounded(expr)), value, True))
+            self.dispatch = None
         else:
             raise SemanticError("Duplicate token definition (%s)"%name)
 
@@ -390,9 +528,31 @@ class Lexer(NamedGroupLexer):
             value = lambda _, value=value: value
         if name not in self.tokens:
             self.tokens.append((name, self.re_compile(self.word_bounded(expr)), value, False))
+            self.dispatch = None
         else:
             raise SemanticError("Duplicate token definition (%s)"%name)
 
+    def value_functions(self):
+        """ return the functions computing the values of the tokens and separators
+        """
+        return [value for name, regexp, value, is_real_token in self.tokens]
+
+    def build(self):
+        """ build the dispatch and non_ascii attributes from the tokens and separators
+        """
+        if self.dispatch is None:
+            dispatch = dict((c, []) for c in _ascii)
+            non_ascii = []
+            for token in self.tokens:
+                first = first_chars(token[1])
+                chars, others = (_ascii, True) if first is None else first
+                for c in chars:
+                    dispatch[c].append(token)
+                if others:
+                    non_ascii.append(token)
+            self.dispatch = dict((c, tuple(tokens)) for c, tokens in dispatch.items())
+            self.non_ascii = tuple(non_ascii)
+
     def start(self, input):
         """ start a lexical analysis
 
@@ -402,6 +562,7 @@ class Lexer(NamedGroupLexer):
         self.input = input
         self.max_pos = 0
         self.last_token = None
+        self.build()
         self.back(None)
         self.next_token()
 
@@ -420,7 +581,7 @@ class Lexer(NamedGroupLexer):
                 return self.cur_token
             tok = None
             text = ""
-            for _name, _regexp, _value, _is_real_token in self.tokens:
+            for _name, _regexp, _value, _is_real_token in self.dispatch.get(self.input[self.pos], self.non_ascii):
                 _tok = _regexp.match(self.input, self.pos)
                 if _tok:
                     _text = _tok.group()
@@ -465,14 +626,19 @@ class CacheNamedGroupLexer(NamedGroupLexer):
         - based on NamedGroupLexer
         - the complete token list is built before parsing
           (faster with very ambigous grammars but needs more memory)
+        - the token list can be saved in a file and memory mapped back
+          instead of lexing the same input again (see token_file)
 
     Attributes:
-        token_re : regular expression containing the whole lexer
-        tokens   : dictionnary name -> (value, is_real_token)
+        token_re   : regular expression containing the whole lexer
+        tokens     : dictionnary name -> (value, is_real_token)
                         name is a token name
                         value is a function that computes the value of a token from its text
                         is_real_token is a boleean. True for tokens, False for separators
-        cache    : token list
+        cache      : token list
+        token_file : file of the token list of the input (see save_tokens), None by default.
+                     When set, start reads the token list from this file if it was saved for
+                     the same input and lexer, and otherwise lexes the input and saves it.
     Once the lexer is started more attributes are defined:
         input      : input string being parsed
         max_pos    : maximum position reached in the input string
@@ -485,6 +651,7 @@ class CacheNamedGroupLexer(NamedGroupLexer):
 
     def __init__(self, wb, compile_options):
         NamedGroupLexer.__init__(self, wb, compile_options)
+        self.token_file = None
 
     def start(self, input):
         """ start a lexical analysis
@@ -492,23 +659,115 @@ class CacheNamedGroupLexer(NamedGroupLexer):
         Parameters:
             input : input string to be parsed
         """
-        self.cache = []
         self.input = input
         self.max_pos = 0
         self.last_token = None
         self.build()
         self.back(None)
-        while True:
-            token = NamedGroupLexer.next_token(self)
-            token.index = len(self.cache)
-            self.cache.append(token)
-            if isinstance(token, EOFToken):
-                break
+        self.cache = None
+        if self.token_file is not None:
+            self.cache = self.load_tokens(self.token_file, input)
+        if self.cache is None:
+            self.cache = []
+            while True:
+                token = NamedGroupLexer.next_token(self)
+                token.index = len(self.cache)
+                self.cache.append(token)
+                if isinstance(token, EOFToken):
+                    break
+            if self.token_file is not None:
+                try:
+                    self.save_tokens(self.token_file)
+                except (OSError, ValueError):
+                    # read-only location or values marshal can not write
+                    pass
         self.max_pos = 0
         self.last_token = None
         self.back(None)
         self.next_token()
 
+    # Change token_version when value functions change in ways spec_crc can not see
+    token_version = 0
+
+    def spec_crc(self):
+        """ return a checksum of the token definitions
+
+        It covers the regular expression of the lexer, token_version and,
+        for every token and separator, its name and the function computing
+        its value (see value_fingerprint).
+        """
+        spec = [self.token_re.pattern, str(self.token_version)]
+        for name, (value, is_real_token) in sorted(self.tokens.items()):
+            spec.append("%s %s %s"%(name, is_real_token, value_fingerprint(value)))
+        return zlib.crc32("\n".join(spec).encode('utf-8')) & 0xffffffff
+
+    def save_tokens(self, path):
+        """ save the token list of the current input in the file path
+
+        The file holds a header, the token names and the distinct token
+        values (written by marshal), then one array of 32 bit integers per
+        token attribute: name, start, stop, line, column, end_line,
+        end_column and value. The input itself is not saved, only its
+        length and checksum. ValueError is raised if a value can not be
+        written by marshal.
+        """
+        names, values = [], []
+        name_index, value_index = {}, {}
+        columns = [[] for _ in _stream_columns]
+        for token in self.cache:
+            if token.name not in name_index:
+                name_index[token.name] = len(names)
+                names.append(token.name)
+            try:
+                v = value_index.setdefault((type(token.value), token.value), len(values))
+            except TypeError:
+                # unhashable values are not shared
+                v = len(values)
+            if v == len(values):
+                values.append(token.value)
+            row = (name_index[token.name], token.start, token.stop, token.line, token.column,
+                   token.end_line, token.end_column, v)
+            for column, x in zip(columns, row):
+                column.append(x)
+        tables = marshal.dumps((names, values))
+        tables += b"\0" * (-len(tables) % 4)
+        data = [_stream_header.pack(_stream_magic, len(self.cache), len(self.input),
+                                    zlib.crc32(self.input.encode('utf-8')) & 0xffffffff,
+                                    self.spec_crc(), len(tables)), tables]
+        for column in columns:
+            data.append(struct.pack("<%dI"%len(column), *column))
+        tmp = "%s.%d.tmp"%(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(b"".join(data))
+        os.replace(tmp, path)
+
+    def load_tokens(self, path, input):
+        """ return the token list saved in the file path for input, or None
+
+        The file is memory mapped and tokens are built when first used.
+        None is returned if the file is missing or was saved for another
+        input or by a lexer with other token definitions.
+        """
+        import mmap
+        try:
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            magic, count, length, crc, spec, size = _stream_header.unpack_from(data)
+            if (magic != _stream_magic or length != len(input) or spec != self.spec_crc()
+                    or crc != zlib.crc32(input.encode('utf-8')) & 0xffffffff):
+                return None
+            offset = _stream_header.size
+            names, values = marshal.loads(data[offset:offset+size])
+            offset += size
+            if len(data) != offset + 4*count*len(_stream_columns):
+                return None
+        except (struct.error, ValueError, EOFError, TypeError):
+            return None
+        return TokenStream(input, names, values, data, offset, count)
+
     def next_token(self):
         """ return the next token
 
@@ -527,6 +786,70 @@ class CacheNamedGroupLexer(NamedGroupLexer):
             self.last_token = self.cur_token
         return self.cur_token
 
+def value_fingerprint(value):
+    """ return a description of a token value function that changes with its code
+
+    Functions are described by their qualified name, a checksum of their
+    bytecode and their default arguments (the constant of a non callable
+    value given to def_token), other callables (classes, builtins) by
+    their qualified name only.
+    """
+    fingerprint = "%s.%s"%(getattr(value, '__module__', None),
+                           getattr(value, '__qualname__', type(value).__qualname__))
+    code = getattr(value, '__code__', None)
+    if code is not None:
+        fingerprint += " %08x %r"%(zlib.crc32(code.co_code) & 0xffffffff, getattr(value, '__defaults__', None))
+    return fingerprint
+
+_stream_magic = b"TPGT\x02\0\0\0"
+_stream_header = struct.Struct("<8sIIIII")
+_stream_columns = ("name", "start", "stop", "line", "column", "end_line", "end_column", "value")
+
+class TokenStream:
+    """ TokenStream(input, names, values, data, offset, count)
+
+    Token list read from a file saved by CacheNamedGroupLexer.save_tokens.
+    Token objects are built when first used.
+
+    Attributes:
+        input   : input string of the tokens
+        names   : token names
+        values  : token values
+        columns : arrays of the token attributes, see save_tokens
+    """
+
+    def __init__(self, input, names, values, data, offset, count):
+        self.input = input
+        self.names = names
+        self.values = values
+        self.tokens = [None] * count
+        view = memoryview(data)
+        self.columns = []
+        for i in range(len(_stream_columns)):
+            column = view[offset + 4*count*i : offset + 4*count*(i+1)]
+            if sys.byteorder == 'little':
+                column = column.cast('I')
+            else:
+                column = struct.unpack("<%dI"%count, column)
+            self.columns.append(column)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, index):
+        token = self.tokens[index]
+        if token is None:
+            name, start, stop, line, column, end_line, end_column, value = [c[index] for c in self.columns]
+            prev_stop = self.columns[2][index-1] if index > 0 else 0
+            if index == len(self.tokens) - 1:
+                token = EOFToken(line, column, start, prev_stop)
+            else:
+                token = Token(self.names[name], self.input[start:stop], self.values[value],
+                              line, column, end_line, end_column, start, stop, prev_stop)
+            token.index = index
+            self.tokens[index] = token
+        return token
+
 class CacheLexer(Lexer):
     r""" CacheLexer(word_bounded, compile_options)
 
@@ -567,6 +890,7 @@ class CacheLexer(Lexer):
         self.input = input
         self.max_pos = 0
         self.last_token = None
+        self.build()
         self.back(None)
         while True:
             token = Lexer.next_token(self)
@@ -603,6 +927,9 @@ class ContextSensitiveLexer(LexerOptions):
     ContextSensitiveLexer is a TPG lexer:
         - context sensitive means that each regular expression is matched when required by the parser.
           Different tokens can be found at the same position if the parser uses different grammar rules.
+        - each token is matched at most once at each position during a parse
+          (the parser backtracks without running regular expressions again)
+        - separators are skipped by a single regular expression and their values are not computed
 
     Attributes:
         tokens     : dictionnary name -> (regexp, value)
@@ -613,6 +940,8 @@ class ContextSensitiveLexer(LexerOptions):
                         name is a token name
                         regexp is the regular expression of the token
                         value is a function that computes the value of a token from its text
+        separator_re : regular expression matching any sequence of separators,
+                       False if the separators can not be combined (back references or global flags)
     Once the lexer is started more attributes are defined:
         input      : input string being parsed
         max_pos    : maximum position reached in the input string
@@ -621,12 +950,17 @@ class ContextSensitiveLexer(LexerOptions):
         line       : line of the current token
         column     : column of the current token
         cur_token  : current token
+        matches    : dictionnary (position, name) -> match of the token at this position
+                        the match is (text, value, end_line, end_column, next_pos, next_line, next_column),
+                        or None if the token does not match
+        skips      : dictionnary position -> (position, line, column) after the separators at this position
     """
 
     def __init__(self, wb, compile_options):
         LexerOptions.__init__(self, wb, compile_options)
         self.tokens = {}                # name -> (regexp, value)
         self.separators = []            # [(name, regexp, value)]
+        self.separator_re = None
 
     def def_token(self, name, expr, value=_id):
         """ add a new token to the lexer
@@ -662,9 +996,31 @@ class ContextSensitiveLexer(LexerOptions):
             value = lambda _, value=value: value
         if name not in self.tokens and name not in self.separators:
             self.separators.append((name, self.re_compile(self.word_bounded(expr)), value))
+            self.separator_re = None
         else:
             raise SemanticError("Duplicate token definition (%s)"%name)
 
+    def value_functions(self):
+        """ return the functions computing the values of the tokens and separators
+        """
+        return ([value for name, (regexp, value) in self.tokens.items()] +
+                [value for name, regexp, value in self.separators])
+
+    # Group numbers and global flags change meaning in a combined expression
+    unsafe_re = re.compile(r"\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)")
+
+    def build(self):
+        """ build the separator_re attribute from the separators
+        """
+        if self.separator_re is None:
+            exprs = [regexp.pattern for name, regexp, value in self.separators]
+            self.separator_re = False
+            if exprs and not any(self.unsafe_re.search(expr) for expr in exprs):
+                try:
+                    self.separator_re = self.re_compile("(?:%s)*"%"|".join("(?:%s)"%expr for expr in exprs))
+                except re.error:
+                    pass
+
     def start(self, input):
         """ start a lexical analysis
 
@@ -674,6 +1030,9 @@ class ContextSensitiveLexer(LexerOptions):
         self.input = input
         self.max_pos = 0
         self.last_token = None
+        self.matches = {}
+        self.skips = {}
+        self.build()
         self.back(None)
 
     def eof(self):
@@ -698,50 +1057,84 @@ class ContextSensitiveLexer(LexerOptions):
     def eat_separators(self):
         """ skip separators in the input string from the current position
         """
-        done = False
-        while not done:
-            done = True
-            for name, regexp, value in self.separators:
-                sep = regexp.match(self.input, self.pos)
-                if sep:
-                    start, stop = sep.span()
-                    text = self.input[start:stop]
-                    value = value(text)
-                    self.pos = stop
-                    if '\n' in text:
-                        self.line += text.count('\n')
-                        self.column = len(text) - text.rfind('\n')
-                    else:
-                        self.column += len(text)
-                    done = False
+        self.pos, self.line, self.column = self.skip(self.pos, self.line, self.column)
 
-    def eat(self, name):
-        """ return the next token value if it matches the expected token name
+    def skip(self, pos, line, column):
+        """ return the position, line and column after the separators found at pos
+
+        The line and column of a position only depend on the input string,
+        so the result is remembered for the whole parse.
+        """
+        skip = self.skips.get(pos)
+        if skip is None:
+            start = pos
+            if self.separator_re:
+                pos = self.separator_re.match(self.input, start).end()
+                newlines = self.input.count('\n', start, pos)
+                if newlines:
+                    line += newlines
+                    column = pos - self.input.rfind('\n', start, pos)
+                else:
+                    column += pos - start
+            else:
+                done = False
+                while not done:
+                    done = True
+                    for name, regexp, value in self.separators:
+                        sep = regexp.match(self.input, pos)
+                        if sep:
+                            stop = sep.end()
+                            text = self.input[pos:stop]
+                            pos = stop
+                            if '\n' in text:
+                                line += text.count('\n')
+                                column = len(text) - text.rfind('\n')
+                            else:
+                                column += len(text)
+                            done = False
+            skip = self.skips[start] = pos, line, column
+        return skip
+
+    def match(self, name):
+        """ return the match of the token name at the current position, or None
         """
         regexp, value = self.tokens[name]
         tok = regexp.match(self.input, self.pos)
         if tok is None:
+            return None
+        stop = tok.end()
+        text = self.input[self.pos:stop]
+        value = value(text)
+        if '\n' in text:
+            line = self.line + text.count('\n')
+            column = len(text) - text.rfind('\n')
+        else:
+            line, column = self.line, self.column + len(text)
+        return (text, value, line, column) + self.skip(stop, line, column)
+
+    def eat(self, name):
+        """ return the next token value if it matches the expected token name
+        """
+        key = self.pos, name
+        try:
+            match = self.matches[key]
+        except KeyError:
+            match = self.matches[key] = self.match(name)
+        if match is None:
             raise WrongToken
         else:
             if self.cur_token is None:
                 prev_stop = 0
             else:
                 prev_stop = self.cur_token.stop
-            start, stop = tok.span()
-            text = self.input[start:stop]
-            value = value(text)
-            self.pos = stop
-            tok_line, tok_column = self.line, self.column
-            if '\n' in text:
-                self.line += text.count('\n')
-                self.column = len(text) - text.rfind('\n')
-            else:
-                self.column += len(text)
-            self.cur_token = Token(name, text, value, tok_line, tok_column, self.line, self.column, start, stop, prev_stop)
-            if self.pos > self.max_pos:
-                self.max_pos = self.pos
+            text, value, end_line, end_column, pos, line, column = match
+            start = self.pos
+            stop = start + len(text)
+            self.cur_token = Token(name, text, value, self.line, self.column, end_line, end_column, start, stop, prev_stop)
+            if stop > self.max_pos:
+                self.max_pos = stop
                 self.last_token = self.cur_token
-            self.eat_separators()
+            self.pos, self.line, self.column = pos, line, column
             self.cur_token.next_start = self.pos
             return self.cur_token
 
@@ -852,12 +1245,81 @@ class Py:
         return eval(item%self, self.globals, self.locals)
 
 
+# Code generated from grammars, by grammar
+_generated = {}
+
+def _cache_key():
+    """ return the key of the code generated by this version of TPG
+    """
+    stat = os.stat(__file__)
+    return "%s %s %s %s"%(__version__, sys.implementation.cache_tag, stat.st_size, stat.st_mtime)
+
+def cache_path(grammar, env):
+    """ return the file where the code generated from grammar is cached, or None
+
+    The file is in $TPG_CACHE_DIR if defined, otherwise in the __pycache__
+    directory of the module defining the grammar.
+    """
+    directory = os.environ.get('TPG_CACHE_DIR')
+    if directory is None:
+        module = env.get('__file__')
+        if not module:
+            return None
+        directory = os.path.join(os.path.dirname(os.path.abspath(module)), '__pycache__')
+    name = "tpg.%08x.%s.marshal"%(zlib.crc32(grammar.encode('utf-8')) & 0xffffffff, sys.implementation.cache_tag)
+    return os.path.join(directory, name)
+
+def generate(grammar, env):
+    """ return the attributes generated from grammar as a list of (name, value)
+
+    Generated code is compiled once and kept in memory and, like the
+    bytecode of modules, on disk (see cache_path), so the grammar is only
+    parsed and checked by TPGParser when it changes, as does TPG.
+    env is the global namespace of the generated code.
+    """
+    key = _cache_key()
+    codes = _generated.get(grammar)
+    path = cache_path(grammar, env)
+    if codes is None and path is not None:
+        try:
+            with open(path, 'rb') as f:
+                cached_key, cached_grammar, cached_codes = marshal.load(f)
+            if cached_key == key and cached_grammar == grammar:
+                codes = cached_codes
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+    if codes is None:
+        codes = [(attribute, compile(source, "<string>", "exec"))
+                 for attribute, source, code in TPGParser(env)(grammar)]
+        if path is not None and not sys.dont_write_bytecode:
+            _write_cache(path, marshal.dumps((key, grammar, codes)))
+    _generated[grammar] = codes
+    attributes = []
+    for attribute, code in codes:
+        namespace = {}
+        exec(code, env, namespace)
+        attributes.append((attribute, namespace[attribute]))
+    return attributes
+
+def _write_cache(path, data):
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp = "%s.%d.tmp"%(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        # Read-only location: the code is generated again next time.
+        pass
+
 class ParserMetaClass(type):
     """ ParserMetaClass is the metaclass of Parser objects.
 
     When a ParserMetaClass class is defined, its doc string should contain
     a grammar. This grammar is parsed by TPGParser and the generated code
-    is added to the class.
+    is added to the class (see generate for the cache of generated code).
     If the class doesn't have a doc string, nothing is generated
     """
 
@@ -868,8 +1330,7 @@ class ParserMetaClass(type):
         except KeyError:
             pass
         else:
-            parser = TPGParser(sys._getframe(1).f_globals)
-            for attribute, source, code in parser(grammar):
+            for attribute, code in generate(grammar, sys._getframe(1).f_globals):
                 setattr(cls, attribute, code)
 
 if __python__ == 3:
@@ -885,11 +1346,15 @@ class Parser(_Parser):
     #
     # Attributes:
     #   lexer : lexer build from the grammar
+    #   share_lexer : if True (default) the lexer built by init_lexer is shared by
+    #                 all the parsers of the class (see shared_lexer)
     #
     # Methods added to the generated parsers:
     #   init_lexer(self) : return a lexer object to scan the tokens defined by the grammar
     #   <rule>           : each rule is translated into a method with the same name
 
+    share_lexer = True
+
     def __init__(self):
         """ Parser is the base class for parsers.
 
@@ -898,12 +1363,35 @@ class Parser(_Parser):
 
         Attributes:
             lexer : lexer build from the grammar
+            share_lexer : if True (default) the lexer built by init_lexer is shared by
+                          all the parsers of the class (see shared_lexer)
 
         Methods added to the generated parsers:
             init_lexer(self) : return a lexer object to scan the tokens defined by the grammar
             <rule>           : each rule is translated into a method with the same name
         """
-        self.lexer = self.init_lexer()
+        self.lexer = self.shared_lexer().fork()
+        if isinstance(self.lexer, ContextSensitiveLexer):
+            # init_lexer, which also does it, only runs for the first parser of the class
+            self.eat = self.eatCSL
+
+    def shared_lexer(self):
+        """ return the lexer built by init_lexer for the parsers of this class
+
+        The token definitions are compiled once per class and every parser
+        forks the shared lexer to get its own lexical analysis state.
+        The lexer is not shared when share_lexer is False or when token
+        values are computed by methods of the parser.
+        """
+        cls = self.__class__
+        lexer = cls.__dict__.get('_shared_lexer')
+        if lexer is None:
+            lexer = self.init_lexer()
+            lexer.build()
+            if cls.share_lexer and not any(getattr(value, '__self__', None) is self
+                                           for value in lexer.value_functions()):
+                cls._shared_lexer = lexer
+        return lexer
 
     def eat(self, name):
         """ eat the current token if it matches the expected token
@@ -949,6 +1437,30 @@ class Parser(_Parser):
             input : input string to parse
             *args : argument list to pass to START
             **kws : argument dictionnary to pass to START
+
+        The parse runs in a new context (see context), so a parser is never
+        changed by parsing and several threads can use the same parser.
+        """
+        return self.context().parse_in_context(axiom, input, *args, **kws)
+
+    def context(self):
+        """ return the context of a new parse
+
+        The context is a copy of the parser with its own lexer, forked from
+        the lexer of the parser. Rules run on the context, so the attributes
+        they set during a parse are not seen by the parser.
+        """
+        parser = self.__class__.__new__(self.__class__)
+        parser.__dict__.update(self.__dict__)
+        parser.lexer = self.lexer.fork()
+        if isinstance(parser.lexer, ContextSensitiveLexer):
+            parser.eat = parser.eatCSL
+        return parser
+
+    def parse_in_context(self, axiom, input, *args, **kws):
+        """ parse a string starting from a given axiom with this parser
+
+        This parser is the context of the parse, see parse.
         """
         try:
             self.lexer.start(input)
@@ -1112,17 +1624,13 @@ class VerboseParser(Parser):
                 sys.stderr.write(self.token_info(token, "!=", name)+"\n")
             raise
 
-    def parse(self, axiom, input, *args, **kws):
-        """ parse a string starting from a given axiom
+    def parse_in_context(self, axiom, input, *args, **kws):
+        """ parse a string starting from a given axiom with this parser
 
-        Parameters:
-            axiom : rule name where the parser starts
-            input : input string to parse
-            *args : argument list to pass to START
-            **kws : argument dictionnary to pass to START
+        This parser is the context of the parse, see parse.
         """
         self.axiom = axiom
-        return Parser.parse(self, axiom, input, *args, **kws)
+        return Parser.parse_in_context(self, axiom, input, *args, **kws)
 
     def token_info(self, token, op, expected):
         """ return information about a token
@@ -1726,6 +2234,7 @@ class TPGParser(tpg.Parser):
         return self.parse('START', input, *args, **kws)
 
     def re_check(self, expr, tok):
+        import_sre_parse()
         try:
             sre_parse.parse(eval(self.string_prefix+expr))
         except Exception:
@@ -1733,10 +2242,10 @@ class TPGParser(tpg.Parser):
 
     def code_check(self, code, tok):
         try:
-            parser.suite(code.code)
+            compile(code.code, "<string>", "exec")
         except Exception:
             erroneous_code = "\n".join([ "%2d: %s"%(i+1, l) for (i, l) in enumerate(code.code.splitlines()) ])
-            raise LexicalError((tok.line, tok.column), "Invalid Python code (%s): \n%s"%(exc, erroneous_code))
+            raise LexicalError((tok.line, tok.column), "Invalid Python code (%s): \n%s"%(exc(), erroneous_code))
 
     class Options:
         option_dict = {